@@ -3,13 +3,25 @@ from __future__ import annotations
 from datetime import datetime
 from datetime import timezone
 from typing import Any
+from typing import Iterable
+import hashlib
 import json
 import logging
 import re
 
+from app.message_records import MessageRecord
+
 
 logger = logging.getLogger(__name__)
 
+MESSAGE_TAGS_INSTRUCTION = (
+    'Respond with a JSON object of the form '
+    '{"messages": [{"channel_id": <int>, "message_id": <int>, "hashtags": ["#tag", ...]}]} '
+    'with one entry for every message, using an empty "hashtags" list when no tag applies.'
+)
+# Output tokens of one entry of that answer, with room for a few hashtags.
+MESSAGE_TAGS_OUTPUT_TOKENS = 40
+
 
 def ensure_aware(value: datetime) -> datetime:
     if value.tzinfo is None:
@@ -43,6 +55,65 @@ def extract_json_payload(content: str) -> dict[str, Any]:
         return json.loads(match.group(0))
 
 
+def is_json_object(content: str) -> bool:
+    try:
+        return isinstance(extract_json_payload(content), dict)
+    except json.JSONDecodeError:
+        return False
+
+
+class JsonItemStream:
+    def __init__(self) -> None:
+        self.text = ''
+        self.depth: list[str] = []
+        self.in_string = False
+        self.escaped = False
+        self.string_start = 0
+        self.key: str | None = None
+        self.item_start = 0
+        self.items = 0
+
+    def feed(self, text: str) -> list[tuple[str | None, dict[str, Any]]]:
+        # Returns the objects inside the top-level arrays that this text completes,
+        # paired with the key of their array.
+        completed: list[tuple[str | None, dict[str, Any]]] = []
+        start = len(self.text)
+        self.text += text
+        for index in range(start, len(self.text)):
+            char = self.text[index]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == ['{']:
+                        self.key = self.text[self.string_start + 1 : index]
+                continue
+            if not self.depth and char != '{':
+                # Skips code fences and any prose around the object.
+                continue
+            if char == '"':
+                self.in_string = True
+                self.string_start = index
+            elif char in '{[':
+                self.depth.append(char)
+                if self.depth == ['{', '[', '{']:
+                    self.item_start = index
+            elif char in '}]' and self.depth:
+                if self.depth == ['{', '[', '{']:
+                    try:
+                        item = json.loads(self.text[self.item_start : index + 1])
+                    except json.JSONDecodeError:
+                        item = None
+                    if isinstance(item, dict):
+                        self.items += 1
+                        completed.append((self.key, item))
+                self.depth.pop()
+        return completed
+
+
 def merge_hashtag_counts(
     target: dict[str, int],
     items: list[dict[str, Any]],
@@ -62,50 +133,85 @@ def merge_hashtag_counts(
         target[tag] = target.get(tag, 0) + count_value
 
 
-def format_message_block(message: dict[str, Any]) -> str:
-    date_value = message.get('date')
-    if isinstance(date_value, datetime):
-        date_value = date_value.isoformat()
+def content_version(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()[:16]
+
+
+def vocabulary_version(hashtags: Iterable[str]) -> str:
+    return content_version('\n'.join(sorted(set(hashtags))))
+
+
+def extract_message_tags(payload: dict[str, Any]) -> dict[tuple[int, int], list[str]]:
+    results: dict[tuple[int, int], list[str]] = {}
+    items = payload.get('messages')
+    if not isinstance(items, list):
+        return results
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            key = (int(item['channel_id']), int(item['message_id']))
+        except (KeyError, TypeError, ValueError):
+            continue
+        raw_tags = item.get('hashtags')
+        if not isinstance(raw_tags, list):
+            continue
+        tags: list[str] = []
+        for raw_tag in raw_tags:
+            tag = normalize_tag(str(raw_tag))
+            if tag and tag not in tags:
+                tags.append(tag)
+        results[key] = tags
+    return results
+
+
+def count_message_tags(tags_by_message: Iterable[list[str]]) -> list[dict[str, Any]]:
+    counts: dict[str, int] = {}
+    for tags in tags_by_message:
+        for tag in tags:
+            counts[tag] = counts.get(tag, 0) + 1
+    return [{'tag': tag, 'count': count} for tag, count in counts.items()]
+
+
+def format_message_block(message: MessageRecord) -> str:
     lines = [
         'message:',
-        f"channel_id: {message.get('channel_id')}",
-        f"message_id: {message.get('message_id')}",
-        f"user_id: {message.get('user_id')}",
-        f'date: {date_value}',
+        f'channel_id: {message.channel_id}',
+        f'message_id: {message.message_id}',
+        f'user_id: {message.user_id}',
+        f'date: {message.date.isoformat()}',
     ]
-    reply = message.get('reply_to')
+    reply = message.reply_to
     if reply:
         lines.extend(
             [
                 'reply:',
-                f"  message_id: {reply.get('message_id')}",
-                f"  user_id: {reply.get('user_id')}",
+                f'  message_id: {reply.message_id}',
+                f'  user_id: {reply.user_id}',
             ],
         )
-        reply_text = reply.get('text')
-        if reply_text:
-            lines.append(f'  text: {reply_text}')
-    forwarded = message.get('forwarded')
+        if reply.text:
+            lines.append(f'  text: {reply.text}')
+    forwarded = message.forwarded
     if forwarded:
         lines.extend(
             [
                 'forwarded:',
-                f"  from_user_id: {forwarded.get('from_user_id')}",
-                f"  from_channel_id: {forwarded.get('from_channel_id')}",
-                f"  from_name: {forwarded.get('from_name')}",
-                f"  from_message_id: {forwarded.get('from_message_id')}",
+                f'  from_user_id: {forwarded.from_user_id}',
+                f'  from_channel_id: {forwarded.from_channel_id}',
+                f'  from_name: {forwarded.from_name}',
+                f'  from_message_id: {forwarded.from_message_id}',
             ],
         )
     lines.append('text:')
-    lines.append(message.get('text') or '')
+    lines.append(message.text)
     return '\n'.join(lines)
 
 
-def collect_participant_channel_pairs(
-    messages: list[dict[str, Any]],
-) -> set[tuple[int, int]]:
-    pairs: set[tuple[int, int]] = set()
-
+def add_participant_channel_pairs(
+    pairs: set[tuple[int, int]],
+    message: MessageRecord,
+) -> None:
     def add_pair(user_id: Any, channel_id: Any) -> None:
         if not user_id or not channel_id:
             return
@@ -118,11 +224,15 @@ def collect_participant_channel_pairs(
             return
         pairs.add((user_id_int, channel_id_int))
 
-    for message in messages:
-        channel_id = message.get('channel_id')
-        add_pair(message.get('user_id'), channel_id)
+    add_pair(message.user_id, message.channel_id)
+    if message.reply_to:
+        add_pair(message.reply_to.user_id, message.channel_id)
 
-        reply = message.get('reply_to') or {}
-        add_pair(reply.get('user_id'), channel_id)
 
+def collect_participant_channel_pairs(
+    messages: Iterable[MessageRecord],
+) -> set[tuple[int, int]]:
+    pairs: set[tuple[int, int]] = set()
+    for message in messages:
+        add_participant_channel_pairs(pairs, message)
     return pairs
@@ -1,29 +1,54 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
+from datetime import datetime
+from functools import partial
+from typing import Any
+from typing import Awaitable
 
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi import Query
+from fastapi.responses import StreamingResponse
 
+from app.analysis_utils import MESSAGE_TAGS_INSTRUCTION
+from app.analysis_utils import MESSAGE_TAGS_OUTPUT_TOKENS
+from app.analysis_utils import add_participant_channel_pairs
 from app.analysis_utils import collect_participant_channel_pairs
+from app.analysis_utils import content_version
 from app.analysis_utils import ensure_aware
 from app.analysis_utils import extract_json_payload
 from app.analysis_utils import format_message_block
 from app.analysis_utils import merge_hashtag_counts
+from app.analysis_utils import vocabulary_version
 from app.api.dependencies import get_deepseek
 from app.api.dependencies import get_storage
 from app.api.dependencies import get_telegram
 from app.config import DEEPSEEK_MAX_OUTPUT_TOKENS
 from app.config import DEEPSEEK_TEMPERATURE
+from app.deepseek import ChunkProgress
 from app.deepseek import DeepSeek
+from app.exceptions import AppError
 from app.exceptions import ExternalServiceError
 from app.exceptions import NotFoundError
 from app.exceptions import ValidationError
+from app.hashtag_progress import HashtagProgress
+from app.message_archive import stream_channel_window
+from app.message_archive import sync_channel_archive
+from app.message_records import MessageRecord
+from app.message_tags import MEMO_LOOKUP_BATCH
+from app.message_tags import MessageTagMemo
 from app.schemas import HashtagAnalysisRequest
 from app.schemas import HashtagAnalysisResponse
 from app.schemas import HashtagFrequency
+from app.schemas import UsageReport
 from app.storage import Storage
+from app.storage.repositories.usage_ledger import USAGE_GROUPS
 from app.telethon_service import TelegramService
+from app.usage_ledger import UsageScope
+from app.usage_ledger import track_usage
 
 
 logger = logging.getLogger(__name__)
@@ -32,11 +57,10 @@ router = APIRouter(prefix='/analysis', tags=['analysis'])
 
 
 async def sync_participants(
-    messages: list[dict],
+    pairs: set[tuple[int, int]],
     storage: Storage,
     telegram: TelegramService,
 ) -> None:
-    pairs = collect_participant_channel_pairs(messages)
     if not pairs:
         return
     user_ids = {user_id for user_id, _ in pairs}
@@ -50,25 +74,36 @@ async def sync_participants(
     if not missing_ids:
         return
     try:
-        profiles = await telegram.fetch_user_profiles(missing_ids)
+        async for profiles in telegram.iter_user_profiles(missing_ids):
+            await storage.participants.upsert_details(profiles)
     except Exception as exc:
         logger.warning('Failed to fetch participant profiles: %s', exc)
-        return
-    if profiles:
-        await storage.participants.upsert_details(profiles)
 
 
-@router.post('/hashtags', response_model=HashtagAnalysisResponse)
-async def analyze_hashtags(
+async def request_deepseek(request: Awaitable[list[str | None]], scope: UsageScope) -> list[str | None]:
+    try:
+        with track_usage(scope):
+            return await request
+    except AppError:
+        raise
+    except Exception as exc:
+        logger.warning('DeepSeek analysis failed: %s', exc)
+        raise ExternalServiceError('DeepSeek request failed') from exc
+
+
+async def run_hashtag_analysis(
     payload: HashtagAnalysisRequest,
-    storage: Storage = Depends(get_storage),
-    deepseek: DeepSeek = Depends(get_deepseek),
-    telegram: TelegramService = Depends(get_telegram),
-):
+    storage: Storage,
+    deepseek: DeepSeek,
+    telegram: TelegramService,
+    progress: ChunkProgress | None = None,
+) -> HashtagAnalysisResponse:
     start_date = ensure_aware(payload.start_date)
     end_date = ensure_aware(payload.end_date)
     if end_date < start_date:
         raise ValidationError('End date must be after start date')
+    if payload.stream and payload.chunk_planner != 'greedy':
+        raise ValidationError('Streamed analyses dispatch chunks as they fill and only support the greedy planner')
 
     prompt = await storage.prompts.get_by_id(payload.prompt_id)
     if not prompt:
@@ -94,58 +129,162 @@ async def analyze_hashtags(
             hashtags=[],
         )
 
-    messages = await telegram.fetch_channel_messages(
-        channels,
-        start_date=start_date,
-        end_date=end_date,
-        max_messages=payload.max_messages_per_channel,
-        include_replies=False,
-    )
-    messages.sort(key=lambda item: item['date'])
-    if not messages:
+    existing_hashtags = await storage.hashtags.list_all()
+    vocabulary = vocabulary_version(existing_hashtags)
+    scope = UsageScope(prompt_id=prompt['id'], channel_ids=channel_ids, token_budget=payload.token_budget)
+    system_prompt = prompt['content']
+    memo = None
+    max_blocks = None
+    chunk_plan = None
+    if payload.memoize:
+        system_prompt = f'{system_prompt}\n\n{MESSAGE_TAGS_INSTRUCTION}'
+        memo = MessageTagMemo(storage, prompt['id'], content_version(system_prompt), vocabulary)
+        # The answer lists every message of the chunk, so it bounds the chunk size.
+        max_blocks = DEEPSEEK_MAX_OUTPUT_TOKENS // MESSAGE_TAGS_OUTPUT_TOKENS
+    if payload.stream:
+        channel_reports: list[dict] = []
+        pairs: set[tuple[int, int]] = set()
+        total_messages = 0
+
+        async def stream_messages():
+            nonlocal total_messages
+            batch: list[MessageRecord] = []
+            async for message in stream_channel_window(
+                storage,
+                telegram,
+                channels,
+                start_date=start_date,
+                end_date=end_date,
+                max_per_channel=payload.max_messages_per_channel,
+                reports=channel_reports,
+            ):
+                total_messages += 1
+                add_participant_channel_pairs(pairs, message)
+                if memo is None:
+                    yield message
+                    continue
+                batch.append(message)
+                if len(batch) >= MEMO_LOOKUP_BATCH:
+                    for pending in await memo.filter(batch):
+                        yield pending
+                    batch = []
+            if batch:
+                for pending in await memo.filter(batch):
+                    yield pending
+
+        responses = await request_deepseek(
+            deepseek.chat_in_streamed_chunks(
+                system_prompt=system_prompt,
+                hashtags=existing_hashtags,
+                message_blocks=stream_messages(),
+                format_block=format_message_block,
+                max_tokens=DEEPSEEK_MAX_OUTPUT_TOKENS,
+                temperature=DEEPSEEK_TEMPERATURE,
+                progress=progress,
+                max_blocks=max_blocks,
+                expect_json=True,
+                allow_partial=True,
+            ),
+            scope,
+        )
+        try:
+            await sync_participants(pairs, storage, telegram)
+        except Exception as exc:
+            logger.warning('Participant sync failed: %s', exc)
+    else:
+        channel_reports = await sync_channel_archive(
+            storage,
+            telegram,
+            channels,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        messages = await storage.messages.list_window(
+            channel_ids,
+            start_date=start_date,
+            end_date=end_date,
+            max_per_channel=payload.max_messages_per_channel,
+        )
+        total_messages = len(messages)
+        responses = []
+        if messages:
+            try:
+                await sync_participants(collect_participant_channel_pairs(messages), storage, telegram)
+            except Exception as exc:
+                logger.warning('Participant sync failed: %s', exc)
+            pending = messages if memo is None else await memo.filter(messages)
+            blocks = await deepseek.run_planner(lambda: [format_message_block(message) for message in pending])
+
+            def plan_chunks(planner: str):
+                return deepseek.run_planner(
+                    partial(
+                        deepseek.plan_chunks,
+                        system_prompt=system_prompt,
+                        hashtags=existing_hashtags,
+                        message_blocks=blocks,
+                        max_output_tokens=DEEPSEEK_MAX_OUTPUT_TOKENS,
+                        planner=planner,
+                        ordered=payload.ordered_chunks,
+                        max_blocks=max_blocks,
+                    ),
+                )
+
+            plan = await plan_chunks(payload.chunk_planner)
+            baseline = plan if plan.planner == 'greedy' else await plan_chunks('greedy')
+            chunk_plan = plan.report(baseline)
+            responses = await request_deepseek(
+                deepseek.run_chunks(
+                    system_prompt=system_prompt,
+                    chunks=plan.chunks,
+                    max_tokens=DEEPSEEK_MAX_OUTPUT_TOKENS,
+                    temperature=DEEPSEEK_TEMPERATURE,
+                    progress=progress,
+                    expect_json=True,
+                    allow_partial=True,
+                ),
+                scope,
+            )
+
+    if not total_messages:
         return HashtagAnalysisResponse(
             prompt_id=payload.prompt_id,
             start_date=start_date,
             end_date=end_date,
             channels=channel_ids,
             total_messages=0,
+            vocabulary_version=vocabulary,
             hashtags=[],
+            channel_reports=channel_reports,
         )
 
-    try:
-        await sync_participants(messages, storage, telegram)
-    except Exception as exc:
-        logger.warning('Participant sync failed: %s', exc)
-
-    existing_hashtags = await storage.hashtags.list_all()
     counts: dict[str, int] = {}
-    blocks = [format_message_block(message) for message in messages]
-    try:
-        responses = await deepseek.chat_in_chunks(
-            system_prompt=prompt['content'],
-            hashtags=existing_hashtags,
-            message_blocks=blocks,
-            max_tokens=DEEPSEEK_MAX_OUTPUT_TOKENS,
-            temperature=DEEPSEEK_TEMPERATURE,
-        )
-    except ExternalServiceError:
-        raise
-    except Exception as exc:
-        logger.warning('DeepSeek analysis failed: %s', exc)
-        raise ExternalServiceError('DeepSeek request failed') from exc
-
-    for content in responses:
+    failed_chunks: list[int] = []
+    for index, content in enumerate(responses):
+        # Failed chunks are reported instead of discarding the ones that succeeded.
+        if content is None:
+            failed_chunks.append(index)
+            continue
         try:
             payload_data = extract_json_payload(content)
         except Exception as exc:
             logger.warning('DeepSeek response parsing failed: %s', exc)
-            raise ExternalServiceError('DeepSeek response parsing failed') from exc
+            failed_chunks.append(index)
+            continue
         if not isinstance(payload_data, dict):
-            raise ExternalServiceError('DeepSeek response parsing failed')
+            failed_chunks.append(index)
+            continue
+        if memo is not None:
+            memo.collect(payload_data)
+            continue
 
         items = payload_data.get('hashtags', [])
         if isinstance(items, list):
             merge_hashtag_counts(counts, items)
+    if responses and len(failed_chunks) == len(responses):
+        raise ExternalServiceError('DeepSeek request failed')
+    if memo is not None:
+        await memo.save()
+        merge_hashtag_counts(counts, memo.hashtag_items())
 
     existing_set = set(existing_hashtags)
 
@@ -163,6 +302,83 @@ async def analyze_hashtags(
         start_date=start_date,
         end_date=end_date,
         channels=channel_ids,
-        total_messages=len(messages),
+        total_messages=total_messages,
+        memoized_messages=memo.memoized if memo is not None else 0,
+        vocabulary_version=vocabulary,
+        tokens_used=scope.tokens_used,
+        chunk_plan=chunk_plan,
+        total_chunks=len(responses),
+        failed_chunks=failed_chunks,
         hashtags=hashtags,
+        channel_reports=channel_reports,
     )
+
+
+@router.get('/usage', response_model=UsageReport)
+async def usage_report(
+    start_date: datetime,
+    end_date: datetime,
+    group_by: list[str] = Query(['prompt']),
+    storage: Storage = Depends(get_storage),
+):
+    unknown = [name for name in group_by if name not in USAGE_GROUPS]
+    if unknown:
+        raise ValidationError(f'Unknown usage groups: {unknown}; expected {sorted(USAGE_GROUPS)}')
+    start_date = ensure_aware(start_date)
+    end_date = ensure_aware(end_date)
+    if end_date < start_date:
+        raise ValidationError('End date must be after start date')
+    rows = await storage.usage_ledger.aggregate(
+        list(dict.fromkeys(group_by)),
+        start_date=start_date,
+        end_date=end_date,
+    )
+    return UsageReport(start_date=start_date, end_date=end_date, group_by=group_by, items=rows)
+
+
+@router.post('/hashtags', response_model=HashtagAnalysisResponse)
+async def analyze_hashtags(
+    payload: HashtagAnalysisRequest,
+    storage: Storage = Depends(get_storage),
+    deepseek: DeepSeek = Depends(get_deepseek),
+    telegram: TelegramService = Depends(get_telegram),
+):
+    return await run_hashtag_analysis(payload, storage, deepseek, telegram)
+
+
+@router.post('/hashtags/progress')
+async def analyze_hashtags_with_progress(
+    payload: HashtagAnalysisRequest,
+    storage: Storage = Depends(get_storage),
+    deepseek: DeepSeek = Depends(get_deepseek),
+    telegram: TelegramService = Depends(get_telegram),
+):
+    events: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+
+    async def run() -> None:
+        try:
+            result = await run_hashtag_analysis(
+                payload,
+                storage,
+                deepseek,
+                telegram,
+                progress=HashtagProgress(events.put_nowait),
+            )
+            events.put_nowait({'type': 'result', 'result': result.model_dump(mode='json')})
+        except AppError as exc:
+            events.put_nowait({'type': 'error', 'status_code': exc.status_code, 'detail': exc.detail})
+        except Exception as exc:
+            logger.exception('Hashtag analysis failed: %s', exc)
+            events.put_nowait({'type': 'error', 'status_code': 500, 'detail': 'Internal server error'})
+        finally:
+            events.put_nowait(None)
+
+    async def stream_events():
+        task = asyncio.create_task(run())
+        try:
+            while (event := await events.get()) is not None:
+                yield json.dumps(event, ensure_ascii=False) + '\n'
+        finally:
+            task.cancel()
+
+    return StreamingResponse(stream_events(), media_type='application/x-ndjson')
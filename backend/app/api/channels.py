@@ -110,10 +110,11 @@ async def create_channel(
 
 @router.post('/import', response_model=ChannelImportSummary)
 async def import_channels_from_dialogs(
+    full_rescan: bool = False,
     storage: Storage = Depends(get_storage),
     telegram: TelegramService = Depends(get_telegram),
 ):
-    dialogs = await telegram.list_dialog_channels()
+    dialogs = await telegram.list_dialog_channels(full_rescan=full_rescan)
     if not dialogs:
         return ChannelImportSummary(total_found=0, created=0, skipped=0)
 
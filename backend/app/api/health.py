@@ -3,15 +3,23 @@ from __future__ import annotations
 from fastapi import APIRouter
 from fastapi import Depends
 
+from app.api.dependencies import get_deepseek
 from app.api.dependencies import get_storage
+from app.api.dependencies import get_telegram
+from app.deepseek import DeepSeek
 from app.storage.mongo import ping_mongo
 from app.storage import Storage
+from app.telethon_service import TelegramService
 
 router = APIRouter(tags=["health"])
 
 
 @router.get("/health")
-async def healthcheck(storage: Storage = Depends(get_storage)):
+async def healthcheck(
+    storage: Storage = Depends(get_storage),
+    deepseek: DeepSeek = Depends(get_deepseek),
+    telegram: TelegramService = Depends(get_telegram),
+):
     db_ok = True
     try:
         await storage.db.execute("SELECT 1")
@@ -19,4 +27,12 @@ async def healthcheck(storage: Storage = Depends(get_storage)):
         db_ok = False
 
     mongo_ok = await ping_mongo()
-    return {"postgres": db_ok, "mongo": mongo_ok}
+    return {
+        "postgres": db_ok,
+        "mongo": mongo_ok,
+        "telegram_rpc": telegram.scheduler.stats(),
+        "deepseek_cache": deepseek.cache.stats() if deepseek.cache else None,
+        "deepseek_usage": deepseek.usage_stats(),
+        "deepseek_breaker": deepseek.breaker.stats(),
+        "deepseek_ledger": deepseek.ledger.stats if deepseek.ledger else None,
+    }
@@ -38,7 +38,12 @@ async def get_participant(
     telegram: TelegramService = Depends(get_telegram),
 ):
     try:
-        profiles = await telegram.fetch_user_profiles([user_id])
+        known_photo_ids = await storage.participants.get_photo_ids([user_id])
+        profiles = await telegram.fetch_user_profiles(
+            [user_id],
+            interactive=True,
+            known_photo_ids=known_photo_ids,
+        )
     except Exception as exc:
         logger.warning('Failed to fetch participant %s: %s', user_id, exc)
         profiles = []
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from typing import Any
+import argparse
+import asyncio
+import logging
+
+from telethon.errors import TakeoutInitDelayError
+
+from app.analysis_utils import ensure_aware
+from app.config import POSTGRES_URL
+from app.logging_setup import setup_logging
+from app.message_records import MessageRecord
+from app.storage import Storage
+from app.storage import apply_migrations
+from app.telethon_service import DialogLoader
+from app.telethon_service import TelegramAccount
+from app.telethon_service import TelegramService
+from app.telethon_service import normalize_message_date
+
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+async def backfill_channel(
+    storage: Storage,
+    telegram: TelegramService,
+    account: TelegramAccount,
+    takeout: Any,
+    channel: dict[str, Any],
+    *,
+    since: datetime,
+    batch_size: int,
+    load_dialog_entities: DialogLoader,
+) -> dict[str, Any]:
+    channel_id = int(channel['id'])
+    checkpoint = await storage.messages.get_backfill_checkpoint(channel_id)
+    state = (await storage.messages.get_sync_states([channel_id])).get(channel_id)
+    report = {'channel_id': channel_id, 'messages': 0, 'completed': True}
+    if state is not None and state['synced_from'] <= since:
+        return report
+    if checkpoint is not None and checkpoint['completed'] and checkpoint['target_date'] <= since:
+        return report
+
+    entity, _ = await telegram.resolve_channel_entity(
+        account,
+        channel_id,
+        channel.get('username'),
+        load_dialog_entities,
+    )
+    started_at = datetime.now(timezone.utc)
+    offset_id = checkpoint['offset_id'] if checkpoint is not None else 0
+    # A fresh run continues below what the archive already holds, or starts at the
+    # newest post when the channel has never been synced.
+    offset_date = state['synced_from'] if state is not None and not offset_id else None
+    upper = None
+    if state is not None:
+        upper = {'last_message_id': state['last_message_id'], 'synced_until': state['synced_until']}
+    total = checkpoint['messages'] if checkpoint is not None else 0
+    batch: list[MessageRecord] = []
+    seen = 0
+    oldest_id = offset_id
+    oldest_date: datetime | None = checkpoint['oldest_date'] if checkpoint is not None else None
+
+    async def flush(completed: bool) -> None:
+        nonlocal batch, seen
+        await storage.messages.upsert_many(batch)
+        if upper is not None and (completed or oldest_date is not None):
+            # Posts sharing the oldest second may sit further down the history.
+            synced_from = since if completed else oldest_date + timedelta(seconds=1)
+            await storage.messages.save_sync_states(
+                [
+                    {
+                        'channel_id': channel_id,
+                        'last_message_id': upper['last_message_id'],
+                        'synced_from': synced_from,
+                        'synced_until': upper['synced_until'],
+                    },
+                ],
+            )
+        await storage.messages.save_backfill_checkpoint(
+            {
+                'channel_id': channel_id,
+                'target_date': since,
+                'offset_id': oldest_id,
+                'oldest_date': oldest_date,
+                'messages': total,
+                'completed': completed,
+            },
+        )
+        report['messages'] += len(batch)
+        batch, seen = [], 0
+
+    async for message in takeout.iter_messages(
+        entity,
+        offset_id=offset_id,
+        offset_date=offset_date,
+        wait_time=0,
+    ):
+        message_date = normalize_message_date(message.date)
+        if upper is None and not offset_id:
+            upper = {'last_message_id': message.id, 'synced_until': started_at}
+        if message_date < since:
+            break
+        oldest_id, oldest_date = message.id, message_date
+        seen += 1
+        if message.message:
+            batch.append(telegram.build_message_record(channel_id, message))
+            total += 1
+        if seen >= batch_size:
+            await flush(False)
+    await flush(True)
+    logger.info('Backfilled %s messages of channel %s down to %s', report['messages'], channel_id, since)
+    return report
+
+
+async def run_backfill(
+    *,
+    since: datetime,
+    channel_ids: list[int] | None,
+    batch_size: int,
+) -> list[dict[str, Any]]:
+    storage = await Storage.create(POSTGRES_URL)
+    telegram = TelegramService(storage.entities, storage.dialogs)
+    reports: list[dict[str, Any]] = []
+    try:
+        await apply_migrations(storage.db)
+        await telegram.start()
+        if channel_ids:
+            channels = await storage.channels.list_by_ids(channel_ids)
+        else:
+            channels = await storage.channels.list()
+        account = telegram.pool.pick()
+        load_dialog_entities = telegram.make_dialog_loader()
+        async with account.client.takeout(finalize=True, channels=True, megagroups=True) as takeout:
+            for channel in channels:
+                try:
+                    reports.append(
+                        await backfill_channel(
+                            storage,
+                            telegram,
+                            account,
+                            takeout,
+                            channel,
+                            since=since,
+                            batch_size=batch_size,
+                            load_dialog_entities=load_dialog_entities,
+                        ),
+                    )
+                except Exception as exc:
+                    logger.warning('Backfill of channel %s stopped: %s', channel['id'], exc)
+                    reports.append({'channel_id': int(channel['id']), 'messages': 0, 'completed': False})
+    except TakeoutInitDelayError as exc:
+        logger.error(
+            'Telegram requires a %ss wait before the takeout session starts; '
+            'confirm the export request in a Telegram app and run the backfill again',
+            exc.seconds,
+        )
+    finally:
+        await telegram.close()
+        await storage.close()
+    return reports
+
+
+def parse_date(value: str) -> datetime:
+    return ensure_aware(datetime.fromisoformat(value))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog='python -m app.backfill',
+        description='Archive channel history through a Telegram takeout session. '
+        'Interrupted runs continue from the last stored batch.',
+    )
+    parser.add_argument('--since', type=parse_date, required=True, help='oldest date to archive (ISO 8601)')
+    parser.add_argument('--channel', dest='channel_ids', type=int, action='append', help='channel id, repeatable')
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args()
+    setup_logging()
+    reports = asyncio.run(
+        run_backfill(since=args.since, channel_ids=args.channel_ids, batch_size=args.batch_size),
+    )
+    for report in reports:
+        status = 'done' if report['completed'] else 'interrupted'
+        logger.info('Channel %s: %s messages, %s', report['channel_id'], report['messages'], status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+
+CHUNK_PLANNERS = ('greedy', 'tight', 'balanced')
+
+
+@dataclass(slots=True)
+class ChunkPlan:
+    planner: str
+    chunks: list[tuple[str, int]]
+    user_budget: int
+
+    @property
+    def requests(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def fill_ratio(self) -> float:
+        if not self.chunks:
+            return 0.0
+        return round(sum(tokens for _, tokens in self.chunks) / (self.user_budget * len(self.chunks)), 4)
+
+    def report(self, baseline: ChunkPlan | None = None) -> dict[str, Any]:
+        tokens = [tokens for _, tokens in self.chunks]
+        report: dict[str, Any] = {
+            'planner': self.planner,
+            'requests': self.requests,
+            'fill_ratio': self.fill_ratio,
+            'min_chunk_tokens': min(tokens, default=0),
+            'max_chunk_tokens': max(tokens, default=0),
+        }
+        if baseline is not None:
+            report['greedy_requests'] = baseline.requests
+            report['greedy_fill_ratio'] = baseline.fill_ratio
+        return report
+
+
+def is_full(items: list[int], max_items: int | None) -> bool:
+    return max_items is not None and len(items) >= max_items
+
+
+def pack_in_order(sizes: list[int], capacity: int, max_items: int | None = None) -> list[list[int]]:
+    bins: list[list[int]] = []
+    current: list[int] = []
+    load = 0
+    for index, size in enumerate(sizes):
+        if current and (load + size > capacity or is_full(current, max_items)):
+            bins.append(current)
+            current = []
+            load = 0
+        current.append(index)
+        load += size
+    if current:
+        bins.append(current)
+    return bins
+
+
+def balance_in_order(sizes: list[int], capacity: int, max_items: int | None = None) -> list[list[int]]:
+    # Filling each chunk before starting the next already gives the fewest
+    # contiguous chunks; search for the smallest chunk size that keeps that count.
+    count = len(pack_in_order(sizes, capacity, max_items))
+    low, high = max(max(sizes), -(-sum(sizes) // count)), capacity
+    while low < high:
+        middle = (low + high) // 2
+        if len(pack_in_order(sizes, middle, max_items)) <= count:
+            high = middle
+        else:
+            low = middle + 1
+    return pack_in_order(sizes, high, max_items)
+
+
+def pack_first_fit_decreasing(sizes: list[int], capacity: int, max_items: int | None = None) -> list[list[int]]:
+    bins: list[list[int]] = []
+    loads: list[int] = []
+    for index in sorted(range(len(sizes)), key=lambda item: -sizes[item]):
+        size = sizes[index]
+        for position, load in enumerate(loads):
+            if load + size <= capacity and not is_full(bins[position], max_items):
+                bins[position].append(index)
+                loads[position] += size
+                break
+        else:
+            bins.append([index])
+            loads.append(size)
+    return [sorted(items) for items in bins]
+
+
+def balance_unordered(sizes: list[int], capacity: int, max_items: int | None = None) -> list[list[int]]:
+    bins = pack_first_fit_decreasing(sizes, capacity, max_items)
+    count = len(bins)
+    # First fit decreasing is not monotonic in the chunk size, so keep the last
+    # packing that fit into the original count.
+    low, high = max(max(sizes), -(-sum(sizes) // count)), capacity
+    while low < high:
+        middle = (low + high) // 2
+        candidate = pack_first_fit_decreasing(sizes, middle, max_items)
+        if len(candidate) <= count:
+            bins = candidate
+            high = middle
+        else:
+            low = middle + 1
+    return bins
+
+
+def plan_bins(
+    sizes: list[int],
+    capacity: int,
+    *,
+    planner: str,
+    ordered: bool,
+    max_items: int | None = None,
+) -> list[list[int]]:
+    if not sizes:
+        return []
+    if planner == 'greedy':
+        return pack_in_order(sizes, capacity, max_items)
+    if planner == 'tight':
+        if ordered:
+            return pack_in_order(sizes, capacity, max_items)
+        return pack_first_fit_decreasing(sizes, capacity, max_items)
+    if planner == 'balanced':
+        if ordered:
+            return balance_in_order(sizes, capacity, max_items)
+        return balance_unordered(sizes, capacity, max_items)
+    raise ValueError(f'Unknown chunk planner: {planner}')
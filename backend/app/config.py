@@ -23,7 +23,12 @@ MONGO_DB = os.environ['MONGO_DB']
 TELEGRAM_API_ID = os.environ['TELEGRAM_API_ID']
 TELEGRAM_API_HASH = os.environ['TELEGRAM_API_HASH']
 
-TELETHON_SESSION = os.environ['TELETHON_SESSION']
+TELETHON_SESSIONS = [
+    session.strip()
+    for session in os.environ['TELETHON_SESSION'].split(',')
+    if session.strip()
+]
+TELEGRAM_LIVE_INGEST = os.environ['TELEGRAM_LIVE_INGEST'].lower() in ('1', 'true', 'yes')
 
 DEEPSEEK_API_KEY = os.environ['DEEPSEEK_API_KEY']
 DEEPSEEK_BASE_URL = 'https://api.deepseek.com/v1'
@@ -1,12 +1,32 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timezone
+from functools import partial
+from typing import Any
+from typing import AsyncIterable
+from typing import Callable
 from typing import Iterable
+from typing import TypeVar
 
+import httpx
 import tiktoken
 from openai import AsyncOpenAI
+from openai import DefaultAsyncHttpxClient
 from openai import OpenAIError
+from openai import RateLimitError
 
+from app.analysis_utils import is_json_object
+from app.cache import LruCache
+from app.chunk_planner import ChunkPlan
+from app.chunk_planner import is_full
+from app.chunk_planner import plan_bins
 from app.config import DEEPSEEK_API_KEY
 from app.config import DEEPSEEK_BASE_URL
 from app.config import DEEPSEEK_MAX_INPUT_TOKENS
@@ -15,14 +35,39 @@ from app.config import DEEPSEEK_MAX_TOTAL_TOKENS
 from app.config import DEEPSEEK_MODEL
 from app.config import DEEPSEEK_TIMEOUT_SECONDS
 from app.exceptions import ExternalServiceError
+from app.rate_limit import TokenBucket
+from app.resilience import CircuitBreaker
+from app.resilience import is_retryable
+from app.resilience import retry_delay
+from app.response_cache import ResponseCache
+from app.response_cache import response_cache_key
+from app.usage_ledger import UsageLedger
+from app.usage_ledger import chunk_index
+from app.usage_ledger import usage_scope
 
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
 TOKEN_OVERHEAD_PER_MESSAGE = 4
 TOKEN_OVERHEAD_REQUEST = 2
 TOKEN_SAFETY_MARGIN = 128
 
+MAX_CONCURRENCY = 8
+TOKENS_PER_MINUTE = 2000000
+TOKEN_CACHE_SIZE = 200000
+PLANNER_WORKERS = 2
+PLANNER_BATCH_SIZE = 256
+CHUNK_PLANNER = 'greedy'
+MAX_RETRIES = 4
+RETRY_BASE_SECONDS = 1
+RETRY_MAX_SECONDS = 30
+PARSE_RETRIES = 1
+HEDGE_AFTER_SECONDS = 0
+BREAKER_FAILURES = 5
+BREAKER_RESET_SECONDS = 30
+
 
 class _PromptBuilder:
     def __init__(self) -> None:
@@ -44,19 +89,253 @@ class _PromptBuilder:
         return '\n\n'.join(self._sections).strip()
 
 
+def read_usage(usage: Any) -> dict[str, int]:
+    if usage is None:
+        return {}
+    hit_tokens = getattr(usage, 'prompt_cache_hit_tokens', None)
+    if hit_tokens is None:
+        details = getattr(usage, 'prompt_tokens_details', None)
+        hit_tokens = getattr(details, 'cached_tokens', None) or 0
+    miss_tokens = getattr(usage, 'prompt_cache_miss_tokens', None)
+    if miss_tokens is None:
+        miss_tokens = (usage.prompt_tokens or 0) - hit_tokens
+    return {
+        'prompt_tokens': usage.prompt_tokens or 0,
+        'completion_tokens': usage.completion_tokens or 0,
+        'prompt_cache_hit_tokens': hit_tokens,
+        'prompt_cache_miss_tokens': miss_tokens,
+    }
+
+
+class ChunkProgress:
+    def started(self, index: int) -> None:
+        pass
+
+    def delta(self, index: int, text: str) -> None:
+        pass
+
+    def finished(self, index: int) -> None:
+        pass
+
+    def retried(self, index: int) -> None:
+        pass
+
+    def failed(self, index: int, error: str) -> None:
+        pass
+
+
+class TokenCounter:
+    def __init__(self, tokenizer: Any, max_entries: int = TOKEN_CACHE_SIZE) -> None:
+        self.tokenizer = tokenizer
+        self.counts = LruCache(max_entries)
+        # Planner threads share the cache.
+        self.lock = threading.Lock()
+
+    def cache_key(self, text: str) -> bytes:
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = self.cache_key(text)
+        with self.lock:
+            count = self.counts.get(key)
+        if count is None:
+            count = len(self.tokenizer.encode(text))
+            with self.lock:
+                self.counts.set(key, count)
+        return count
+
+    def count_many(self, texts: list[str]) -> list[int]:
+        keys = [self.cache_key(text) for text in texts]
+        with self.lock:
+            counts = [self.counts.get(key) for key in keys]
+        missing = [index for index, count in enumerate(counts) if count is None]
+        if missing:
+            encoded = self.tokenizer.encode_batch([texts[index] for index in missing])
+            with self.lock:
+                for index, tokens in zip(missing, encoded):
+                    counts[index] = len(tokens)
+                    self.counts.set(keys[index], len(tokens))
+        return counts
+
+    def encode(self, text: str) -> list[int]:
+        tokens = self.tokenizer.encode(text)
+        with self.lock:
+            self.counts.set(self.cache_key(text), len(tokens))
+        return tokens
+
+
+def build_user_content(prefix: str, blocks: list[str]) -> str:
+    if not blocks:
+        return prefix
+    if not prefix:
+        return '\n\n'.join(blocks)
+    return f'{prefix}\n' + '\n\n'.join(blocks)
+
+
+class ChunkPacker:
+    def __init__(
+        self,
+        *,
+        prefix: str,
+        prefix_tokens: int,
+        user_budget: int,
+        separator_tokens: int,
+        split_block: Callable[[str, int], list[tuple[str, int]]],
+        max_blocks: int | None = None,
+    ) -> None:
+        self.prefix = prefix
+        self.prefix_tokens = prefix_tokens
+        self.user_budget = user_budget
+        self.separator_tokens = separator_tokens
+        self.split_block = split_block
+        self.max_blocks = max_blocks
+        self.max_block_tokens = max(1, user_budget - prefix_tokens)
+        self.current_blocks: list[str] = []
+        self.current_tokens = prefix_tokens
+
+    def add(self, block: str) -> list[tuple[str, int]]:
+        completed: list[tuple[str, int]] = []
+        for part, part_tokens in self.split_block(block, self.max_block_tokens):
+            extra = self.separator_tokens if self.current_blocks else 0
+            if self.current_blocks and (
+                self.current_tokens + extra + part_tokens > self.user_budget
+                or is_full(self.current_blocks, self.max_blocks)
+            ):
+                completed.append(self.flush())
+                extra = 0
+            if self.current_tokens + extra + part_tokens > self.user_budget:
+                raise ExternalServiceError('DeepSeek request is too large')
+            self.current_blocks.append(part)
+            self.current_tokens += extra + part_tokens
+        return completed
+
+    def flush(self) -> tuple[str, int]:
+        chunk = (build_user_content(self.prefix, self.current_blocks), self.current_tokens)
+        self.current_blocks = []
+        self.current_tokens = self.prefix_tokens
+        return chunk
+
+    def finish(self) -> tuple[str, int] | None:
+        if not self.current_blocks:
+            return None
+        return self.flush()
+
+
 class DeepSeek:
-    def __init__(self, api_key: str = DEEPSEEK_API_KEY) -> None:
+    def __init__(
+        self,
+        api_key: str = DEEPSEEK_API_KEY,
+        *,
+        max_concurrency: int = MAX_CONCURRENCY,
+        tokens_per_minute: int = TOKENS_PER_MINUTE,
+        cache: ResponseCache | None = None,
+        ledger: UsageLedger | None = None,
+        client: AsyncOpenAI | None = None,
+        tokenizer: Any = None,
+    ) -> None:
         self.api_key = api_key
-        self.client = AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=DEEPSEEK_BASE_URL,
-            timeout=DEEPSEEK_TIMEOUT_SECONDS,
+        self.cache = cache
+        self.ledger = ledger
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=DEEPSEEK_BASE_URL,
+                timeout=DEEPSEEK_TIMEOUT_SECONDS,
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=max_concurrency,
+                        max_keepalive_connections=max_concurrency,
+                    ),
+                ),
+            )
+        self.client = client
+        self.max_concurrency = max(1, max_concurrency)
+        self.request_slots = asyncio.Semaphore(self.max_concurrency)
+        self.token_budget = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.token_counter = TokenCounter(tokenizer if tokenizer is not None else self._build_tokenizer(DEEPSEEK_MODEL))
+        self.planner = ThreadPoolExecutor(max_workers=PLANNER_WORKERS, thread_name_prefix='deepseek-planner')
+        self.planner_slots = asyncio.Semaphore(PLANNER_WORKERS)
+        self.planner_batch_size = PLANNER_BATCH_SIZE
+        self.usage = {
+            'requests': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'prompt_cache_hit_tokens': 0,
+            'prompt_cache_miss_tokens': 0,
+            'retries': 0,
+            'parse_retries': 0,
+            'hedged': 0,
+        }
+        self.max_retries = MAX_RETRIES
+        self.retry_base_seconds = RETRY_BASE_SECONDS
+        self.retry_max_seconds = RETRY_MAX_SECONDS
+        self.parse_retries = PARSE_RETRIES
+        self.hedge_after = HEDGE_AFTER_SECONDS
+        self.breaker = CircuitBreaker(
+            'DeepSeek',
+            failure_threshold=BREAKER_FAILURES,
+            reset_seconds=BREAKER_RESET_SECONDS,
         )
-        self._tokenizer = self._build_tokenizer(DEEPSEEK_MODEL)
 
     async def close(self) -> None:
+        self.planner.shutdown(wait=False, cancel_futures=True)
         await self.client.close()
 
+    def record_usage(
+        self,
+        model: str,
+        usage: dict[str, int],
+        latency: float,
+        *,
+        retries: int = 0,
+        cached_response: bool = False,
+        error: bool = False,
+    ) -> None:
+        if self.ledger is not None:
+            self.ledger.record(
+                {
+                    'created_at': datetime.now(timezone.utc),
+                    'model': model,
+                    'input_tokens': usage.get('prompt_tokens', 0),
+                    'output_tokens': usage.get('completion_tokens', 0),
+                    'cached_tokens': usage.get('prompt_cache_hit_tokens', 0),
+                    'latency_ms': round(latency * 1000),
+                    'retries': retries,
+                    'cached_response': cached_response,
+                    'error': error,
+                },
+            )
+        if cached_response or error:
+            return
+        self.usage['requests'] += 1
+        for key, value in usage.items():
+            self.usage[key] += value
+        if usage:
+            logger.info(
+                'DeepSeek usage: %s prompt tokens (%s cached, %s uncached), %s completion tokens',
+                usage['prompt_tokens'],
+                usage['prompt_cache_hit_tokens'],
+                usage['prompt_cache_miss_tokens'],
+                usage['completion_tokens'],
+            )
+
+    def usage_stats(self) -> dict[str, Any]:
+        stats: dict[str, Any] = dict(self.usage)
+        prompt_tokens = stats['prompt_cache_hit_tokens'] + stats['prompt_cache_miss_tokens']
+        stats['prompt_cache_hit_rate'] = (
+            round(stats['prompt_cache_hit_tokens'] / prompt_tokens, 3) if prompt_tokens else 0.0
+        )
+        return stats
+
+    async def run_planner(self, function: Callable[[], T]) -> T:
+        # Formatting and tokenization stay off the event loop; callers past the worker
+        # count wait here instead of queueing unbounded work in the executor.
+        async with self.planner_slots:
+            return await asyncio.get_running_loop().run_in_executor(self.planner, function)
+
     async def chat(
         self,
         messages: list[dict[str, str]],
@@ -64,24 +343,261 @@ class DeepSeek:
         max_tokens: int,
         temperature: float,
         model: str = DEEPSEEK_MODEL,
+        input_tokens: int | None = None,
+        on_delta: Callable[[str], None] | None = None,
+        on_retry: Callable[[], None] | None = None,
+        expect_json: bool = False,
+    ) -> str:
+        cache_key = None
+        if self.cache is not None:
+            cache_key = response_cache_key(model, temperature, messages)
+            cached = await self.cache.get(cache_key)
+            if cached is not None and (not expect_json or is_json_object(cached)):
+                self.record_usage(model, {}, 0.0, cached_response=True)
+                if on_delta is not None:
+                    on_delta(cached)
+                return cached
+        # The budget is charged up front with the largest completion the request may produce.
+        if input_tokens is None:
+            input_tokens = sum(self._count_tokens(item['content']) for item in messages)
+        params = {
+            'model': model,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+        }
+        content = await self.request(params, input_tokens + max_tokens, on_delta, on_retry)
+        parse_retries = self.parse_retries if expect_json else 0
+        while expect_json and not is_json_object(content):
+            if parse_retries <= 0:
+                raise ExternalServiceError('DeepSeek response parsing failed')
+            parse_retries -= 1
+            logger.info('DeepSeek response is not a JSON object, retrying in JSON mode')
+            self.usage['parse_retries'] += 1
+            if on_retry is not None:
+                on_retry()
+            # JSON mode requires the prompt to mention JSON.
+            system = {'role': 'system', 'content': 'Respond with a single valid JSON object.'}
+            params = {**params, 'messages': [*messages, system], 'response_format': {'type': 'json_object'}}
+            content = await self.request(params, input_tokens + max_tokens, on_delta, on_retry)
+        if cache_key is not None:
+            await self.cache.set(cache_key, model, content)
+        return content
+
+    async def request(
+        self,
+        params: dict[str, Any],
+        cost: int,
+        on_delta: Callable[[str], None] | None,
+        on_retry: Callable[[], None] | None,
     ) -> str:
+        scope = usage_scope.get()
+        if scope is not None:
+            scope.reserve(cost)
+        usage: dict[str, int] = {}
+        attempt = 0
         try:
-            response = await self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-        except OpenAIError as exc:
-            logger.warning('DeepSeek request failed: %s', exc)
-            raise ExternalServiceError('DeepSeek request failed') from exc
-        if not response.choices:
-            raise ExternalServiceError('DeepSeek response parsing failed')
-        content = response.choices[0].message.content
+            while True:
+                self.breaker.check()
+                try:
+                    async with self.request_slots:
+                        await self.token_budget.acquire(cost=cost)
+                        started = time.monotonic()
+                        try:
+                            if on_delta is None:
+                                content, usage = await self.hedged_completion(params)
+                            else:
+                                content, usage = await self.stream_completion(params, on_delta)
+                        except BaseException:
+                            # Failed, timed out and cancelled attempts may still be billed.
+                            self.record_usage(
+                                params['model'],
+                                {},
+                                time.monotonic() - started,
+                                retries=attempt,
+                                error=True,
+                            )
+                            raise
+                        latency = time.monotonic() - started
+                except (OpenAIError, httpx.TransportError) as exc:
+                    if not is_retryable(exc):
+                        # The provider answered, so this says nothing about its health.
+                        self.breaker.record_success()
+                        logger.warning('DeepSeek request failed: %s', exc)
+                        raise ExternalServiceError('DeepSeek request failed') from exc
+                    if isinstance(exc, RateLimitError):
+                        # Throttling means the provider is up; a burst of 429s across
+                        # concurrent chunks must not open the circuit.
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_failure()
+                    if attempt >= self.max_retries:
+                        logger.warning('DeepSeek request failed after %s retries: %s', attempt, exc)
+                        raise ExternalServiceError('DeepSeek request failed') from exc
+                    delay = retry_delay(exc, attempt, base=self.retry_base_seconds, cap=self.retry_max_seconds)
+                    logger.info('DeepSeek request failed (%s), retrying in %.1fs', exc, delay)
+                    attempt += 1
+                    self.usage['retries'] += 1
+                    if on_retry is not None:
+                        on_retry()
+                    await asyncio.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                break
+        finally:
+            if scope is not None:
+                scope.settle(cost, usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0))
+        self.record_usage(params['model'], usage, latency, retries=attempt)
         if not content:
             raise ExternalServiceError('DeepSeek response parsing failed')
         return content
 
+    async def completion(self, params: dict[str, Any]) -> tuple[str, dict[str, int]]:
+        # Streamed even when nobody reads the deltas, so a long answer is not cut
+        # off by the client timeout and retried from scratch.
+        return await self.stream_completion(params)
+
+    async def hedged_completion(self, params: dict[str, Any]) -> tuple[str, dict[str, int]]:
+        if self.hedge_after <= 0:
+            return await self.completion(params)
+        started = time.monotonic()
+        tasks = [asyncio.create_task(self.completion(params))]
+        winner: asyncio.Task | None = None
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                # A duplicate of a slow request often lands on a faster replica;
+                # the first answer wins and the other is cancelled.
+                self.usage['hedged'] += 1
+                tasks.append(asyncio.create_task(self.completion(params)))
+                pending.add(tasks[-1])
+            error: BaseException | None = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            losers = [task for task in tasks if task is not winner]
+            if winner is None:
+                # request() records the attempt whose failure it sees.
+                losers = losers[1:]
+            for task in losers:
+                latency = time.monotonic() - started
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    # The duplicate that also finished is billed like any other request.
+                    self.record_hedged_usage(params['model'], task.result()[1], latency)
+                    continue
+                task.cancel()
+                self.record_usage(params['model'], {}, latency, error=True)
+
+    def record_hedged_usage(self, model: str, usage: dict[str, int], latency: float) -> None:
+        scope = usage_scope.get()
+        if scope is not None:
+            scope.settle(0, usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0))
+        self.record_usage(model, usage, latency)
+
+    async def stream_completion(
+        self,
+        params: dict[str, Any],
+        on_delta: Callable[[str], None] | None = None,
+    ) -> tuple[str, dict[str, int]]:
+        # The client timeout applies between streamed events, so long generations
+        # are not cut off while tokens keep arriving.
+        stream = await self.client.chat.completions.create(
+            stream=True,
+            stream_options={'include_usage': True},
+            **params,
+        )
+        parts: list[str] = []
+        usage: dict[str, int] = {}
+        async for event in stream:
+            if getattr(event, 'usage', None) is not None:
+                usage = read_usage(event.usage)
+            if not event.choices:
+                continue
+            text = event.choices[0].delta.content
+            if text:
+                parts.append(text)
+                if on_delta is not None:
+                    on_delta(text)
+        return ''.join(parts), usage
+
+    async def chat_chunk(
+        self,
+        system_prompt: str,
+        user_content: str,
+        *,
+        max_tokens: int,
+        temperature: float,
+        model: str,
+        user_tokens: int | None = None,
+        on_delta: Callable[[str], None] | None = None,
+        on_retry: Callable[[], None] | None = None,
+        expect_json: bool = False,
+    ) -> str:
+        input_tokens = None
+        if user_tokens is not None:
+            input_tokens = self._count_tokens(system_prompt) + user_tokens
+        return await self.chat(
+            [
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': user_content},
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            model=model,
+            input_tokens=input_tokens,
+            on_delta=on_delta,
+            on_retry=on_retry,
+            expect_json=expect_json,
+        )
+
+    async def run_chunk(
+        self,
+        index: int,
+        system_prompt: str,
+        chunk: tuple[str, int],
+        *,
+        max_tokens: int,
+        temperature: float,
+        model: str,
+        progress: ChunkProgress | None,
+        expect_json: bool = False,
+        allow_partial: bool = False,
+    ) -> str | None:
+        user_content, user_tokens = chunk
+        chunk_index.set(index)
+        if progress is not None:
+            progress.started(index)
+        try:
+            content = await self.chat_chunk(
+                system_prompt,
+                user_content,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                model=model,
+                user_tokens=user_tokens,
+                on_delta=partial(progress.delta, index) if progress is not None else None,
+                on_retry=partial(progress.retried, index) if progress is not None else None,
+                expect_json=expect_json,
+            )
+        except ExternalServiceError as exc:
+            if not allow_partial:
+                raise
+            # The other chunks keep running; the caller reports this one as failed.
+            logger.warning('DeepSeek chunk %s failed: %s', index, exc.detail)
+            if progress is not None:
+                progress.failed(index, exc.detail)
+            return None
+        if progress is not None:
+            progress.finished(index)
+        return content
+
     async def chat_in_chunks(
         self,
         *,
@@ -91,29 +607,151 @@ class DeepSeek:
         max_tokens: int = DEEPSEEK_MAX_OUTPUT_TOKENS,
         temperature: float,
         model: str = DEEPSEEK_MODEL,
-    ) -> list[str]:
+        progress: ChunkProgress | None = None,
+        planner: str = CHUNK_PLANNER,
+        ordered: bool = True,
+        max_blocks: int | None = None,
+        expect_json: bool = False,
+        allow_partial: bool = False,
+    ) -> list[str | None]:
         if not message_blocks:
             return []
-        chunks = self._build_chunked_user_messages(
+        plan = await self.run_planner(
+            partial(
+                self.plan_chunks,
+                system_prompt=system_prompt,
+                hashtags=hashtags,
+                message_blocks=message_blocks,
+                max_output_tokens=max_tokens,
+                planner=planner,
+                ordered=ordered,
+                max_blocks=max_blocks,
+            ),
+        )
+        return await self.run_chunks(
+            system_prompt=system_prompt,
+            chunks=plan.chunks,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            model=model,
+            progress=progress,
+            expect_json=expect_json,
+            allow_partial=allow_partial,
+        )
+
+    async def run_chunks(
+        self,
+        *,
+        system_prompt: str,
+        chunks: list[tuple[str, int]],
+        max_tokens: int = DEEPSEEK_MAX_OUTPUT_TOKENS,
+        temperature: float,
+        model: str = DEEPSEEK_MODEL,
+        progress: ChunkProgress | None = None,
+        expect_json: bool = False,
+        allow_partial: bool = False,
+    ) -> list[str | None]:
+        scope = usage_scope.get()
+        if scope is not None:
+            # Fails before the first request when the planned chunks cannot fit the budget.
+            system_tokens = self._count_tokens(system_prompt)
+            scope.check(sum(system_tokens + user_tokens + max_tokens for _, user_tokens in chunks))
+        tasks = [
+            asyncio.create_task(
+                self.run_chunk(
+                    index,
+                    system_prompt,
+                    chunk,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    model=model,
+                    progress=progress,
+                    expect_json=expect_json,
+                    allow_partial=allow_partial,
+                ),
+            )
+            for index, chunk in enumerate(chunks)
+        ]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    async def chat_in_streamed_chunks(
+        self,
+        *,
+        system_prompt: str,
+        hashtags: list[str],
+        message_blocks: AsyncIterable[Any],
+        format_block: Callable[[Any], str] = str,
+        max_tokens: int = DEEPSEEK_MAX_OUTPUT_TOKENS,
+        temperature: float,
+        model: str = DEEPSEEK_MODEL,
+        progress: ChunkProgress | None = None,
+        max_blocks: int | None = None,
+        expect_json: bool = False,
+        allow_partial: bool = False,
+    ) -> list[str | None]:
+        packer = self.create_chunk_packer(
             system_prompt=system_prompt,
             hashtags=hashtags,
-            message_blocks=message_blocks,
             max_output_tokens=max_tokens,
+            max_blocks=max_blocks,
         )
-        results: list[str] = []
-        for user_content in chunks:
-            results.append(
-                await self.chat(
-                    [
-                        {'role': 'system', 'content': system_prompt},
-                        {'role': 'user', 'content': user_content},
-                    ],
+        tasks: list[asyncio.Task[str | None]] = []
+        # Packing pauses while every request slot is taken, so the message stream
+        # is only read as fast as DeepSeek answers.
+        in_flight = asyncio.Semaphore(self.max_concurrency)
+
+        async def dispatch(chunk: tuple[str, int]) -> None:
+            await in_flight.acquire()
+            task = asyncio.create_task(
+                self.run_chunk(
+                    len(tasks),
+                    system_prompt,
+                    chunk,
                     max_tokens=max_tokens,
                     temperature=temperature,
                     model=model,
+                    progress=progress,
+                    expect_json=expect_json,
+                    allow_partial=allow_partial,
                 ),
             )
-        return results
+            task.add_done_callback(lambda _: in_flight.release())
+            tasks.append(task)
+            logger.debug('Dispatched DeepSeek chunk %s', len(tasks))
+
+        def pack(items: list[Any]) -> list[tuple[str, int]]:
+            blocks = [format_block(item) for item in items]
+            self.token_counter.count_many(blocks)
+            chunks: list[tuple[str, int]] = []
+            for block in blocks:
+                chunks.extend(packer.add(block))
+            return chunks
+
+        try:
+            batch: list[Any] = []
+            async for item in message_blocks:
+                batch.append(item)
+                if len(batch) < self.planner_batch_size:
+                    continue
+                for chunk in await self.run_planner(partial(pack, batch)):
+                    await dispatch(chunk)
+                batch = []
+            chunks = await self.run_planner(partial(pack, batch)) if batch else []
+            last = packer.finish()
+            if last is not None:
+                chunks.append(last)
+            for chunk in chunks:
+                await dispatch(chunk)
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
 
     def _build_tokenizer(self, model: str):
         try:
@@ -122,9 +760,7 @@ class DeepSeek:
             return tiktoken.get_encoding('cl100k_base')
 
     def _count_tokens(self, text: str) -> int:
-        if not text:
-            return 0
-        return len(self._tokenizer.encode(text))
+        return self.token_counter.count(text)
 
     def _user_token_budget(self, system_prompt: str, max_output_tokens: int) -> int:
         input_budget = min(
@@ -141,65 +777,134 @@ class DeepSeek:
 
     def _build_user_prefix(self, hashtags: list[str]) -> str:
         builder = _PromptBuilder()
-        builder.add_lines('EXISTING_HASHTAGS', hashtags)
+        # The system prompt and this prefix open every chunk. Sorting keeps them
+        # byte-identical across chunks and runs, so DeepSeek serves them from its
+        # context cache at the cache-hit price.
+        builder.add_lines('EXISTING_HASHTAGS', sorted(set(hashtags)))
         builder.add_heading('MESSAGES')
         return builder.render()
 
-    def _build_user_content(self, prefix: str, blocks: list[str]) -> str:
-        if not blocks:
-            return prefix
-        if not prefix:
-            return '\n\n'.join(blocks)
-        return f'{prefix}\n' + '\n\n'.join(blocks)
-
-    def _split_long_block(self, block: str, max_tokens: int) -> list[str]:
+    def _split_long_block(self, block: str, max_tokens: int) -> list[tuple[str, int]]:
         if max_tokens <= 0:
             raise ExternalServiceError('DeepSeek request is too large')
-        tokens = self._tokenizer.encode(block)
+        block_tokens = self._count_tokens(block)
+        if block_tokens <= max_tokens:
+            return [(block, block_tokens)]
+        # Cuts between lines where possible; only a single line longer than the
+        # budget is cut at a token boundary.
+        lines = block.splitlines(keepends=True)
+        line_tokens = [len(tokens) for tokens in self.token_counter.tokenizer.encode_batch(lines)]
+        parts: list[tuple[str, int]] = []
+        current: list[str] = []
+        current_tokens = 0
+        for line, tokens in zip(lines, line_tokens):
+            if current and current_tokens + tokens > max_tokens:
+                parts.extend(self.cut_block(''.join(current), max_tokens))
+                current = []
+                current_tokens = 0
+            current.append(line)
+            current_tokens += tokens
+        if current:
+            parts.extend(self.cut_block(''.join(current), max_tokens))
+        return parts
+
+    def cut_block(self, block: str, max_tokens: int) -> list[tuple[str, int]]:
+        tokens = self.token_counter.encode(block)
         if len(tokens) <= max_tokens:
-            return [block]
-        parts: list[str] = []
+            return [(block, len(tokens))]
+        parts: list[tuple[str, int]] = []
         for index in range(0, len(tokens), max_tokens):
-            parts.append(self._tokenizer.decode(tokens[index : index + max_tokens]))
+            part = tokens[index : index + max_tokens]
+            parts.append((self.token_counter.tokenizer.decode(part), len(part)))
         return parts
 
-    def _build_chunked_user_messages(
+    def create_chunk_packer(
         self,
         *,
         system_prompt: str,
         hashtags: list[str],
-        message_blocks: list[str],
         max_output_tokens: int,
-    ) -> list[str]:
+        max_blocks: int | None = None,
+    ) -> ChunkPacker:
         user_budget = self._user_token_budget(system_prompt, max_output_tokens)
         prefix = self._build_user_prefix(hashtags)
         prefix_tokens = self._count_tokens(f'{prefix}\n') if prefix else 0
         if prefix_tokens >= user_budget:
             raise ExternalServiceError('DeepSeek request is too large')
+        return ChunkPacker(
+            prefix=prefix,
+            prefix_tokens=prefix_tokens,
+            user_budget=user_budget,
+            separator_tokens=self._count_tokens('\n\n'),
+            split_block=self._split_long_block,
+            max_blocks=max_blocks,
+        )
 
-        separator_tokens = self._count_tokens('\n\n')
-        chunks: list[list[str]] = []
-        current_blocks: list[str] = []
-        current_tokens = prefix_tokens
-        max_block_tokens = max(1, user_budget - prefix_tokens)
-
+    def _build_chunked_user_messages(
+        self,
+        *,
+        system_prompt: str,
+        hashtags: list[str],
+        message_blocks: list[str],
+        max_output_tokens: int,
+        max_blocks: int | None = None,
+    ) -> list[tuple[str, int]]:
+        packer = self.create_chunk_packer(
+            system_prompt=system_prompt,
+            hashtags=hashtags,
+            max_output_tokens=max_output_tokens,
+            max_blocks=max_blocks,
+        )
+        # Counts every uncached block in one batch; the packer then reads them from the cache.
+        self.token_counter.count_many(message_blocks)
+        chunks: list[tuple[str, int]] = []
         for block in message_blocks:
-            parts = self._split_long_block(block, max_block_tokens)
-            for part in parts:
-                part_tokens = self._count_tokens(part)
-                extra = separator_tokens if current_blocks else 0
-                if current_blocks and current_tokens + extra + part_tokens > user_budget:
-                    chunks.append(current_blocks)
-                    current_blocks = []
-                    current_tokens = prefix_tokens
-                    extra = 0
-                if current_tokens + extra + part_tokens > user_budget:
-                    raise ExternalServiceError('DeepSeek request is too large')
-                if extra:
-                    current_tokens += separator_tokens
-                current_blocks.append(part)
-                current_tokens += part_tokens
-
-        if current_blocks:
-            chunks.append(current_blocks)
-        return [self._build_user_content(prefix, blocks) for blocks in chunks]
+            chunks.extend(packer.add(block))
+        last = packer.finish()
+        if last is not None:
+            chunks.append(last)
+        return chunks
+
+    def plan_chunks(
+        self,
+        *,
+        system_prompt: str,
+        hashtags: list[str],
+        message_blocks: list[str],
+        max_output_tokens: int,
+        planner: str = CHUNK_PLANNER,
+        ordered: bool = True,
+        max_blocks: int | None = None,
+    ) -> ChunkPlan:
+        # max_blocks caps the blocks per chunk for prompts whose answer grows with
+        # every block, so that the answer still fits max_output_tokens.
+        if planner == 'greedy':
+            chunks = self._build_chunked_user_messages(
+                system_prompt=system_prompt,
+                hashtags=hashtags,
+                message_blocks=message_blocks,
+                max_output_tokens=max_output_tokens,
+                max_blocks=max_blocks,
+            )
+            return ChunkPlan(planner, chunks, self._user_token_budget(system_prompt, max_output_tokens))
+        packer = self.create_chunk_packer(
+            system_prompt=system_prompt,
+            hashtags=hashtags,
+            max_output_tokens=max_output_tokens,
+            max_blocks=max_blocks,
+        )
+        self.token_counter.count_many(message_blocks)
+        parts = [part for block in message_blocks for part in self._split_long_block(block, packer.max_block_tokens)]
+        # Each block also carries the separator in front of it; the first block's
+        # separator is covered by adding one to the capacity.
+        separator = packer.separator_tokens
+        sizes = [tokens + separator for _, tokens in parts]
+        capacity = packer.user_budget - packer.prefix_tokens + separator
+        chunks = [
+            (
+                build_user_content(packer.prefix, [parts[index][0] for index in items]),
+                packer.prefix_tokens + sum(sizes[index] for index in items) - separator,
+            )
+            for items in plan_bins(sizes, capacity, planner=planner, ordered=ordered, max_items=max_blocks)
+        ]
+        return ChunkPlan(planner, chunks, packer.user_budget)
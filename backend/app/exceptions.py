@@ -27,3 +27,11 @@ class ConflictError(AppError):
 
 class ExternalServiceError(AppError):
     status_code = status.HTTP_502_BAD_GATEWAY
+
+
+class BudgetExceededError(AppError):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+
+
+class ServiceUnavailableError(ExternalServiceError):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
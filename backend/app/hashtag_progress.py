@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from typing import Any
+from typing import Callable
+
+from app.analysis_utils import JsonItemStream
+from app.analysis_utils import count_message_tags
+from app.analysis_utils import extract_message_tags
+from app.analysis_utils import merge_hashtag_counts
+from app.deepseek import ChunkProgress
+
+
+class HashtagProgress(ChunkProgress):
+    def __init__(self, emit: Callable[[dict[str, Any]], None]) -> None:
+        self.emit = emit
+        self.parsers: dict[int, JsonItemStream] = {}
+        self.counts: dict[str, int] = {}
+        self.chunk_counts: dict[int, dict[str, int]] = {}
+        self.finished_chunks = 0
+        self.failed_chunks = 0
+
+    def started(self, index: int) -> None:
+        self.parsers[index] = JsonItemStream()
+        self.chunk_counts[index] = {}
+        self.emit({'type': 'chunk_started', 'chunk': index, 'chunks_started': len(self.parsers)})
+
+    def delta(self, index: int, text: str) -> None:
+        parser = self.parsers[index]
+        items = parser.feed(text)
+        if not items:
+            return
+        found: dict[str, int] = {}
+        merge_hashtag_counts(found, [item for key, item in items if key == 'hashtags'])
+        messages = extract_message_tags({'messages': [item for key, item in items if key == 'messages']})
+        merge_hashtag_counts(found, count_message_tags(messages.values()))
+        chunk_counts = self.chunk_counts[index]
+        for tag, count in found.items():
+            self.counts[tag] = self.counts.get(tag, 0) + count
+            chunk_counts[tag] = chunk_counts.get(tag, 0) + count
+        self.emit(
+            {
+                'type': 'hashtags',
+                'chunk': index,
+                'items': parser.items,
+                'hashtags': [{'tag': tag, 'count': count} for tag, count in found.items()],
+            },
+        )
+
+    def finished(self, index: int) -> None:
+        self.finished_chunks += 1
+        self.emit(
+            {
+                'type': 'chunk_finished',
+                'chunk': index,
+                'items': self.parsers[index].items,
+                'chunks_started': len(self.parsers),
+                'chunks_finished': self.finished_chunks,
+                'counts': dict(self.counts),
+            },
+        )
+
+    def retried(self, index: int) -> None:
+        # Hashtags streamed by the failed attempt are taken back before the retry streams again.
+        self.discard(index)
+        self.parsers[index] = JsonItemStream()
+        self.emit({'type': 'chunk_retried', 'chunk': index, 'counts': dict(self.counts)})
+
+    def failed(self, index: int, error: str) -> None:
+        self.discard(index)
+        self.failed_chunks += 1
+        self.emit(
+            {
+                'type': 'chunk_failed',
+                'chunk': index,
+                'error': error,
+                'chunks_failed': self.failed_chunks,
+                'counts': dict(self.counts),
+            },
+        )
+
+    def discard(self, index: int) -> None:
+        for tag, count in self.chunk_counts.pop(index, {}).items():
+            remaining = self.counts.get(tag, 0) - count
+            if remaining > 0:
+                self.counts[tag] = remaining
+            else:
+                self.counts.pop(tag, None)
+        self.chunk_counts[index] = {}
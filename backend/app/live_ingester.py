@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+from contextlib import suppress
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+import asyncio
+import logging
+import time
+
+from telethon import events
+from telethon import types
+
+from app.message_archive import sync_channel_archive
+from app.message_records import MessageRecord
+from app.storage import Storage
+from app.telethon_service import TelegramService
+
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+FLUSH_SECONDS = 2
+REFRESH_SECONDS = 60
+
+
+class LiveIngester:
+    def __init__(
+        self,
+        storage: Storage,
+        telegram: TelegramService,
+        *,
+        queue_size: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        flush_seconds: float = FLUSH_SECONDS,
+        refresh_seconds: float = REFRESH_SECONDS,
+    ) -> None:
+        self.storage = storage
+        self.telegram = telegram
+        self.queue: asyncio.Queue[MessageRecord] = asyncio.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.refresh_seconds = refresh_seconds
+        self.tracked: set[int] = set()
+        self.since: dict[int, datetime] = {}
+        self.covered: set[int] = set()
+        self.members: set[int] = set()
+        self.handlers = [
+            (self.handle_event, events.NewMessage()),
+            (self.handle_event, events.MessageEdited()),
+        ]
+        self.tasks: list[asyncio.Task] = []
+        self.stats = {'received': 0, 'written': 0, 'dropped': 0}
+
+    async def start(self) -> None:
+        await self.track_channels()
+        for account in self.telegram.accounts:
+            for callback, event in self.handlers:
+                account.client.add_event_handler(callback, event)
+        self.tasks = [
+            asyncio.create_task(self.catch_up()),
+            asyncio.create_task(self.run()),
+        ]
+
+    async def close(self) -> None:
+        for account in self.telegram.accounts:
+            for callback, event in self.handlers:
+                account.client.remove_event_handler(callback, event)
+        for task in self.tasks:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        batch, drained_at = self.drain()
+        await self.flush(batch, drained_at)
+
+    async def track_channels(self) -> None:
+        channels = await self.storage.channels.list()
+        now = datetime.now(timezone.utc)
+        tracked = {int(channel['id']) for channel in channels}
+        for channel_id in tracked - self.tracked:
+            self.since[channel_id] = now
+        for channel_id in self.tracked - tracked:
+            self.since.pop(channel_id, None)
+            self.covered.discard(channel_id)
+        self.tracked = tracked
+
+    async def refresh_members(self) -> None:
+        self.members = await self.telegram.member_channel_ids()
+
+    async def refresh_coverage(self) -> None:
+        # Telegram only pushes posts of channels an account has joined; the others
+        # are left to the history sync.
+        self.covered &= self.members
+        pending = [
+            channel_id
+            for channel_id in self.tracked
+            if channel_id not in self.covered and channel_id in self.members
+        ]
+        if not pending:
+            return
+        states = await self.storage.messages.get_sync_states(pending)
+        for channel_id in pending:
+            state = states.get(channel_id)
+            since = self.since.get(channel_id)
+            if since is None:
+                continue
+            if state is None or state['synced_until'] >= since:
+                self.covered.add(channel_id)
+
+    async def catch_up(self) -> None:
+        await self.refresh_members()
+        states = await self.storage.messages.get_sync_states(list(self.tracked & self.members))
+        channels = await self.storage.channels.list_by_ids(
+            [
+                channel_id
+                for channel_id, state in states.items()
+                if state['synced_until'] < self.since[channel_id]
+            ],
+        )
+        if channels:
+            now = datetime.now(timezone.utc)
+            try:
+                await sync_channel_archive(self.storage, self.telegram, channels, start_date=now, end_date=now)
+            except Exception as exc:
+                logger.warning('Live ingester catch-up failed: %s', exc)
+        await self.refresh_coverage()
+        logger.info('Live ingester covers %s of %s channels', len(self.covered), len(self.tracked))
+
+    async def handle_event(self, event: Any) -> None:
+        message = event.message
+        if not isinstance(message.peer_id, types.PeerChannel) or not message.message:
+            return
+        channel_id = message.peer_id.channel_id
+        if channel_id not in self.tracked:
+            return
+        self.stats['received'] += 1
+        try:
+            self.queue.put_nowait(self.telegram.build_message_record(channel_id, message))
+        except asyncio.QueueFull:
+            # The archive now has a hole for this channel; it stays uncovered until
+            # an archive sync reaches past this moment again.
+            self.stats['dropped'] += 1
+            self.covered.discard(channel_id)
+            self.since[channel_id] = datetime.now(timezone.utc)
+
+    def drain(self, batch: list[MessageRecord] | None = None) -> tuple[list[MessageRecord], datetime | None]:
+        batch = batch or []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return batch, datetime.now(timezone.utc)
+        return batch, None
+
+    async def next_batch(self) -> tuple[list[MessageRecord], datetime | None]:
+        batch: list[MessageRecord] = []
+        with suppress(TimeoutError):
+            batch.append(await asyncio.wait_for(self.queue.get(), self.flush_seconds))
+        return self.drain(batch)
+
+    async def flush(self, batch: list[MessageRecord], drained_at: datetime | None) -> None:
+        messages = {(item.channel_id, item.message_id): item for item in batch}
+        last_ids: dict[int, int] = {}
+        for channel_id, message_id in messages:
+            last_ids[channel_id] = max(last_ids.get(channel_id, 0), message_id)
+        try:
+            await self.storage.messages.upsert_many(list(messages.values()))
+        except Exception as exc:
+            logger.warning('Live ingester failed to store %s messages: %s', len(messages), exc)
+            now = datetime.now(timezone.utc)
+            for channel_id in last_ids:
+                self.covered.discard(channel_id)
+                self.since[channel_id] = now
+            return
+        self.stats['written'] += len(messages)
+        if drained_at is None:
+            return
+        # A covered channel's archive reaches the moment listening started, so every
+        # post up to the moment the queue ran empty is stored and the window can be
+        # served without asking Telegram.
+        states = [
+            {
+                'channel_id': channel_id,
+                'last_message_id': last_ids.get(channel_id, 0),
+                'synced_from': self.since[channel_id],
+                'synced_until': drained_at,
+            }
+            for channel_id in self.covered
+        ]
+        await self.storage.messages.save_sync_states(states)
+
+    async def run(self) -> None:
+        refreshed = time.monotonic()
+        while True:
+            batch, drained_at = await self.next_batch()
+            try:
+                await self.flush(batch, drained_at)
+                if time.monotonic() - refreshed >= self.refresh_seconds:
+                    refreshed = time.monotonic()
+                    await self.track_channels()
+                    await self.refresh_members()
+                    await self.refresh_coverage()
+            except Exception as exc:
+                logger.warning('Live ingester flush failed: %s', exc)
@@ -0,0 +1,22 @@
+import logging
+
+from colorlog import ColoredFormatter
+
+
+def setup_logging() -> None:
+    color_handler = logging.StreamHandler()
+    color_handler.setLevel(logging.DEBUG)
+    color_handler.setFormatter(ColoredFormatter(
+        '%(log_color)s%(asctime)s.%(msecs)03d [%(levelname).1s] (%(name)s.%(funcName)s:%(lineno)d): %(message)s',
+        log_colors={
+            'DEBUG': 'light_blue',
+            'INFO': 'green',
+            'WARNING': 'yellow',
+            'ERROR': 'red',
+            'CRITICAL': 'bold_red',
+        },
+        datefmt='%Y-%m-%d %H:%M:%S',
+    ))
+    logging.basicConfig(level=logging.DEBUG, handlers=[color_handler])
+    logging.getLogger('telethon').setLevel(logging.INFO)
+    logging.getLogger('pymongo').setLevel(logging.INFO)
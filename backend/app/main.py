@@ -15,26 +15,40 @@ from app.config import API_PREFIX
 from app.config import APP_NAME
 from app.config import CORS_ORIGINS
 from app.config import POSTGRES_URL
+from app.config import TELEGRAM_LIVE_INGEST
 from app.deepseek import DeepSeek
 from app.exception_handlers import register_exception_handlers
+from app.live_ingester import LiveIngester
+from app.response_cache import ResponseCache
 from app.storage import Storage
 from app.storage import apply_migrations
 from app.telethon_service import TelegramService
+from app.usage_ledger import UsageLedger
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     storage = await Storage.create(POSTGRES_URL)
     await apply_migrations(storage.db)
-    deepseek = DeepSeek()
-    telegram = TelegramService()
+    ledger = UsageLedger(storage.usage_ledger)
+    ledger.start()
+    deepseek = DeepSeek(cache=ResponseCache(storage.response_cache), ledger=ledger)
+    telegram = TelegramService(storage.entities, storage.dialogs)
     await telegram.start()
+    ingester = None
+    if TELEGRAM_LIVE_INGEST:
+        ingester = LiveIngester(storage, telegram)
+        await ingester.start()
     app.state.storage = storage
     app.state.deepseek = deepseek
     app.state.telegram = telegram
+    app.state.ingester = ingester
     yield
+    if ingester is not None:
+        await ingester.close()
     await telegram.close()
     await deepseek.close()
+    await ledger.close()
     await storage.close()
 
 
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+from contextlib import suppress
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+from typing import AsyncIterator
+import asyncio
+import logging
+
+from app.message_records import MessageRecord
+from app.storage import Storage
+from app.telethon_service import DialogLoader
+from app.telethon_service import TelegramService
+
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PAGE_SIZE = 1000
+STREAM_QUEUE_PAGES = 4
+FETCH_CONCURRENCY = 8
+
+
+def plan_sync_jobs(
+    channels: list[dict[str, Any]],
+    states: dict[int, dict[str, Any]],
+    *,
+    start_date: datetime,
+    end_date: datetime,
+) -> list[dict[str, Any]]:
+    jobs: list[dict[str, Any]] = []
+    for channel in channels:
+        channel_id = int(channel['id'])
+        base = {'id': channel_id, 'username': channel.get('username')}
+        state = states.get(channel_id)
+        if state is None:
+            jobs.append({**base, 'kind': 'initial', 'start_date': start_date, 'end_date': end_date})
+            continue
+        if state['synced_from'] > start_date:
+            jobs.append(
+                {
+                    **base,
+                    'kind': 'backfill',
+                    'start_date': start_date,
+                    'end_date': state['synced_from'],
+                },
+            )
+        if state['synced_until'] < end_date:
+            jobs.append(
+                {
+                    **base,
+                    'kind': 'incremental',
+                    'min_id': state['last_message_id'],
+                    'start_date': state['synced_until'],
+                    'end_date': end_date,
+                },
+            )
+    return jobs
+
+
+def build_sync_states(
+    jobs: list[dict[str, Any]],
+    reports: list[dict[str, Any]],
+    states: dict[int, dict[str, Any]],
+    *,
+    fetched_at: datetime,
+) -> list[dict[str, Any]]:
+    updated: list[dict[str, Any]] = []
+    for job, report in zip(jobs, reports):
+        if report.get('error'):
+            continue
+        channel_id = job['id']
+        state = states.get(channel_id)
+        synced_until = min(job['end_date'], fetched_at)
+        if job['kind'] == 'backfill':
+            updated.append(
+                {
+                    'channel_id': channel_id,
+                    'last_message_id': state['last_message_id'],
+                    'synced_from': job['start_date'],
+                    'synced_until': state['synced_until'],
+                },
+            )
+            continue
+        last_message_id = report.get('last_message_id') or job.get('min_id') or 0
+        updated.append(
+            {
+                'channel_id': channel_id,
+                'last_message_id': last_message_id,
+                'synced_from': state['synced_from'] if state else job['start_date'],
+                'synced_until': synced_until,
+            },
+        )
+    return updated
+
+
+def group_jobs_by_channel(jobs: list[dict[str, Any]]) -> dict[int, list[dict[str, Any]]]:
+    grouped: dict[int, list[dict[str, Any]]] = {}
+    for job in jobs:
+        grouped.setdefault(job['id'], []).append(job)
+    return grouped
+
+
+async def iter_sync_jobs(
+    storage: Storage,
+    telegram: TelegramService,
+    jobs: list[dict[str, Any]],
+    states: dict[int, dict[str, Any]],
+    load_dialog_entities: DialogLoader,
+    reports: list[dict[str, Any]],
+) -> AsyncIterator[list[MessageRecord]]:
+    fetched_at = datetime.now(timezone.utc)
+    job_reports: list[dict[str, Any]] = []
+    for job in jobs:
+        report: dict[str, Any] = {}
+        async for page in telegram.iter_channel_history(
+            job['id'],
+            job.get('username'),
+            start_date=job['start_date'],
+            end_date=job['end_date'],
+            min_id=int(job.get('min_id') or 0),
+            include_replies=True,
+            include_forwarded=True,
+            load_dialog_entities=load_dialog_entities,
+            report=report,
+        ):
+            await storage.messages.upsert_many(page)
+            yield page
+        job_reports.append(report)
+    await storage.messages.save_sync_states(
+        build_sync_states(jobs, job_reports, states, fetched_at=fetched_at),
+    )
+    reports.extend(job_reports)
+
+
+async def run_sync_jobs(
+    storage: Storage,
+    telegram: TelegramService,
+    jobs: list[dict[str, Any]],
+    states: dict[int, dict[str, Any]],
+    load_dialog_entities: DialogLoader,
+) -> list[dict[str, Any]]:
+    reports: list[dict[str, Any]] = []
+    async for _ in iter_sync_jobs(storage, telegram, jobs, states, load_dialog_entities, reports):
+        pass
+    return reports
+
+
+def archived_range(
+    state: dict[str, Any] | None,
+    *,
+    start_date: datetime,
+    end_date: datetime,
+) -> tuple[datetime, datetime] | None:
+    if state is None:
+        return None
+    lower = max(start_date, state['synced_from'])
+    upper = min(end_date, state['synced_until'])
+    if lower > upper:
+        return None
+    return lower, upper
+
+
+async def sync_channel_archive(
+    storage: Storage,
+    telegram: TelegramService,
+    channels: list[dict[str, Any]],
+    *,
+    start_date: datetime,
+    end_date: datetime,
+    concurrency: int = FETCH_CONCURRENCY,
+) -> list[dict[str, Any]]:
+    channel_ids = [int(channel['id']) for channel in channels]
+    states = await storage.messages.get_sync_states(channel_ids)
+    jobs = plan_sync_jobs(channels, states, start_date=start_date, end_date=end_date)
+    if not jobs:
+        return []
+    await telegram.start()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    load_dialog_entities = telegram.make_dialog_loader()
+
+    async def sync(channel_jobs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        async with semaphore:
+            return await run_sync_jobs(storage, telegram, channel_jobs, states, load_dialog_entities)
+
+    results = await asyncio.gather(*(sync(channel_jobs) for channel_jobs in group_jobs_by_channel(jobs).values()))
+    reports = [report for channel_reports in results for report in channel_reports]
+    logger.info(
+        'Synced %s messages for %s channels (%s jobs)',
+        sum(report['messages'] for report in reports),
+        len(channel_ids),
+        len(jobs),
+    )
+    return reports
+
+
+async def stream_channel_window(
+    storage: Storage,
+    telegram: TelegramService,
+    channels: list[dict[str, Any]],
+    *,
+    start_date: datetime,
+    end_date: datetime,
+    max_per_channel: int | None = None,
+    reports: list[dict[str, Any]] | None = None,
+    concurrency: int = FETCH_CONCURRENCY,
+) -> AsyncIterator[MessageRecord]:
+    channel_ids = [int(channel['id']) for channel in channels]
+    states = await storage.messages.get_sync_states(channel_ids)
+    jobs_by_channel = group_jobs_by_channel(
+        plan_sync_jobs(channels, states, start_date=start_date, end_date=end_date),
+    )
+    if jobs_by_channel:
+        await telegram.start()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    load_dialog_entities = telegram.make_dialog_loader()
+    queue: asyncio.Queue[list[MessageRecord] | None] = asyncio.Queue(maxsize=STREAM_QUEUE_PAGES)
+
+    async def produce(channel_id: int) -> None:
+        channel_jobs = jobs_by_channel.get(channel_id, [])
+        channel_reports: list[dict[str, Any]] = []
+        if max_per_channel:
+            # The latest messages of the window are only known once all of it is archived.
+            if channel_jobs:
+                async with semaphore:
+                    channel_reports = await run_sync_jobs(storage, telegram, channel_jobs, states, load_dialog_entities)
+            async for page in storage.messages.iter_channel_window(
+                channel_id,
+                start_date=start_date,
+                end_date=end_date,
+                max_per_channel=max_per_channel,
+                page_size=ARCHIVE_PAGE_SIZE,
+            ):
+                await queue.put(page)
+        else:
+            # Fetched pages go out as soon as they are stored; only the part of the
+            # window archived by earlier syncs is read back from the database.
+            stored = archived_range(states.get(channel_id), start_date=start_date, end_date=end_date)
+            fetched_ids: set[int] = set()
+            if channel_jobs:
+                async with semaphore:
+                    async for page in iter_sync_jobs(
+                        storage,
+                        telegram,
+                        channel_jobs,
+                        states,
+                        load_dialog_entities,
+                        channel_reports,
+                    ):
+                        if stored is not None:
+                            # Jobs meet the archived range on its edges, where a message may be in both.
+                            fetched_ids.update(
+                                message.message_id for message in page if stored[0] <= message.date <= stored[1]
+                            )
+                        await queue.put(page)
+            if stored is not None:
+                async for page in storage.messages.iter_channel_window(
+                    channel_id,
+                    start_date=stored[0],
+                    end_date=stored[1],
+                    page_size=ARCHIVE_PAGE_SIZE,
+                ):
+                    page = [message for message in page if message.message_id not in fetched_ids]
+                    if page:
+                        await queue.put(page)
+        if reports is not None:
+            reports.extend(channel_reports)
+
+    async def run_producers() -> None:
+        try:
+            async with asyncio.TaskGroup() as group:
+                for channel_id in channel_ids:
+                    group.create_task(produce(channel_id))
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    producer = asyncio.create_task(run_producers())
+    try:
+        while True:
+            page = await queue.get()
+            if page is None:
+                break
+            for message in page:
+                yield message
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+            with suppress(asyncio.CancelledError):
+                await producer
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from dataclasses import asdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+
+@dataclass(slots=True)
+class ReplyRecord:
+    message_id: int
+    user_id: int | None
+    text: str
+
+
+@dataclass(slots=True)
+class ForwardRecord:
+    from_user_id: int | None
+    from_channel_id: int | None
+    from_name: str | None
+    from_message_id: int | None
+
+
+@dataclass(slots=True)
+class MessageRecord:
+    channel_id: int
+    message_id: int
+    user_id: int | None
+    date: datetime
+    text: str
+    reply_to: ReplyRecord | None = None
+    forwarded: ForwardRecord | None = None
+
+
+def record_to_dict(record: ReplyRecord | ForwardRecord | None) -> dict[str, Any] | None:
+    return asdict(record) if record is not None else None
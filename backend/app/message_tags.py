@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from typing import Any
+import logging
+
+from app.analysis_utils import content_version
+from app.analysis_utils import count_message_tags
+from app.analysis_utils import extract_message_tags
+from app.message_records import MessageRecord
+from app.storage import Storage
+
+
+logger = logging.getLogger(__name__)
+
+MEMO_LOOKUP_BATCH = 500
+
+
+class MessageTagMemo:
+    def __init__(
+        self,
+        storage: Storage,
+        prompt_id: int,
+        prompt_version: str,
+        vocabulary_version: str,
+    ) -> None:
+        self.storage = storage
+        self.prompt_id = prompt_id
+        self.prompt_version = prompt_version
+        self.vocabulary_version = vocabulary_version
+        self.pending: dict[tuple[int, int], str] = {}
+        self.stored: dict[tuple[int, int], list[str]] = {}
+        self.fresh: dict[tuple[int, int], list[str]] = {}
+
+    @property
+    def memoized(self) -> int:
+        return len(self.stored)
+
+    async def filter(self, messages: list[MessageRecord]) -> list[MessageRecord]:
+        requested = [(message.channel_id, message.message_id, content_version(message.text)) for message in messages]
+        try:
+            stored = await self.storage.message_tags.get_many(
+                self.prompt_id,
+                self.prompt_version,
+                self.vocabulary_version,
+                requested,
+            )
+        except Exception as exc:
+            logger.warning('Failed to load memoized message tags: %s', exc)
+            stored = {}
+        pending: list[MessageRecord] = []
+        for message, (channel_id, message_id, text_hash) in zip(messages, requested):
+            key = (channel_id, message_id)
+            tags = stored.get(key)
+            if tags is None:
+                self.pending[key] = text_hash
+                pending.append(message)
+            else:
+                self.stored[key] = tags
+        return pending
+
+    def collect(self, payload: dict[str, Any]) -> None:
+        # Entries for messages that were not sent are ignored.
+        for key, tags in extract_message_tags(payload).items():
+            if key in self.pending:
+                self.fresh[key] = tags
+
+    async def save(self) -> None:
+        results = [
+            (channel_id, message_id, self.pending[(channel_id, message_id)], tags)
+            for (channel_id, message_id), tags in self.fresh.items()
+        ]
+        try:
+            await self.storage.message_tags.save_many(
+                self.prompt_id,
+                self.prompt_version,
+                self.vocabulary_version,
+                results,
+            )
+        except Exception as exc:
+            logger.warning('Failed to store message tags: %s', exc)
+
+    def hashtag_items(self) -> list[dict[str, Any]]:
+        return count_message_tags([*self.stored.values(), *self.fresh.values()])
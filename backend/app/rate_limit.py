@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import time
+
+
+INTERACTIVE_PRIORITY = 0
+BULK_PRIORITY = 1
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiters: list[tuple[int, int]] = []
+        self.sequence = 0
+        self.condition = asyncio.Condition()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float, cost: float) -> float:
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    async def block(self, seconds: float) -> None:
+        async with self.condition:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.condition.notify_all()
+
+    async def acquire(self, priority: int = BULK_PRIORITY, cost: float = 1) -> float:
+        # A request larger than the bucket would never fit, so it waits for a full one.
+        cost = min(cost, self.capacity)
+        started = time.monotonic()
+        async with self.condition:
+            self.sequence += 1
+            waiter = (priority, self.sequence)
+            heapq.heappush(self.waiters, waiter)
+            self.condition.notify_all()
+            try:
+                while True:
+                    timeout = None
+                    if self.waiters[0] == waiter:
+                        now = time.monotonic()
+                        self.refill(now)
+                        timeout = self.wait_time(now, cost)
+                        if timeout <= 0:
+                            heapq.heappop(self.waiters)
+                            self.tokens -= cost
+                            self.condition.notify_all()
+                            return time.monotonic() - started
+                    try:
+                        await asyncio.wait_for(self.condition.wait(), timeout)
+                    except TimeoutError:
+                        pass
+            except BaseException:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                    heapq.heapify(self.waiters)
+                    self.condition.notify_all()
+                raise
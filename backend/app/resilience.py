@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from typing import Any
+import random
+import time
+
+import httpx
+from openai import APIConnectionError
+from openai import APIStatusError
+from openai import InternalServerError
+from openai import RateLimitError
+
+from app.exceptions import ServiceUnavailableError
+
+
+def is_retryable(exc: BaseException) -> bool:
+    # APITimeoutError is an APIConnectionError; httpx errors surface while a
+    # streamed response is being read.
+    return isinstance(exc, (RateLimitError, InternalServerError, APIConnectionError, httpx.TransportError))
+
+
+def retry_delay(exc: BaseException, attempt: int, *, base: float, cap: float) -> float:
+    # Full jitter keeps concurrent chunks from retrying in lockstep.
+    delay = random.uniform(0, min(cap, base * 2**attempt))
+    if isinstance(exc, APIStatusError):
+        retry_after = exc.response.headers.get('retry-after')
+        try:
+            delay = max(delay, min(cap, float(retry_after)))
+        except (TypeError, ValueError):
+            pass
+    return delay
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, *, failure_threshold: int, reset_seconds: float) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probe_started: float | None = None
+        self.counters = {'opened': 0, 'rejected': 0}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return 'open'
+        return 'half_open'
+
+    def retry_in(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        # While a probe is out, the next request may go once it is replaced.
+        since = self.opened_at if self.probe_started is None else self.probe_started
+        return max(0.0, self.reset_seconds - (time.monotonic() - since))
+
+    def check(self) -> None:
+        state = self.state
+        if state == 'closed':
+            return
+        now = time.monotonic()
+        # One request probes the provider after the cooldown; a probe that never
+        # reports back is replaced after another cooldown.
+        if state == 'half_open' and (self.probe_started is None or now - self.probe_started >= self.reset_seconds):
+            self.probe_started = now
+            return
+        self.counters['rejected'] += 1
+        raise ServiceUnavailableError(f'{self.name} is unavailable, retry in {self.retry_in():.0f}s')
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.probe_started is None and self.failures < self.failure_threshold:
+            return
+        if self.opened_at is None:
+            self.counters['opened'] += 1
+        self.opened_at = time.monotonic()
+        self.probe_started = None
+
+    def stats(self) -> dict[str, Any]:
+        return {'state': self.state, 'failures': self.failures, **self.counters}
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from typing import Any
+import hashlib
+import json
+import logging
+
+from app.storage.repositories.response_cache import ResponseCacheRepository
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_EVICT_EVERY = 50
+
+
+def response_cache_key(model: str, temperature: float, messages: list[dict[str, str]]) -> str:
+    payload = json.dumps(
+        [model, repr(float(temperature)), [[item['role'], item['content']] for item in messages]],
+        ensure_ascii=False,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        repository: ResponseCacheRepository,
+        *,
+        max_bytes: int = CACHE_MAX_BYTES,
+        evict_every: int = CACHE_EVICT_EVERY,
+    ) -> None:
+        self.repository = repository
+        self.max_bytes = max_bytes
+        self.evict_every = max(1, evict_every)
+        self.pending_writes = 0
+        self.counters = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0, 'errors': 0}
+
+    async def get(self, key: str) -> str | None:
+        try:
+            content = await self.repository.get(key)
+        except Exception as exc:
+            logger.warning('Response cache lookup failed: %s', exc)
+            self.counters['errors'] += 1
+            content = None
+        self.counters['hits' if content is not None else 'misses'] += 1
+        return content
+
+    async def set(self, key: str, model: str, content: str) -> None:
+        try:
+            await self.repository.put(key, model, content)
+            self.counters['writes'] += 1
+            self.pending_writes += 1
+            if self.pending_writes >= self.evict_every:
+                self.pending_writes = 0
+                self.counters['evicted'] += await self.repository.evict(self.max_bytes)
+        except Exception as exc:
+            logger.warning('Response cache write failed: %s', exc)
+            self.counters['errors'] += 1
+
+    def stats(self) -> dict[str, Any]:
+        stats: dict[str, Any] = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
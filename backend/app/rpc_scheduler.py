@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Iterator
+from typing import TypeVar
+import asyncio
+import logging
+import time
+
+from telethon.errors import FloodWaitError
+
+from app.rate_limit import BULK_PRIORITY
+from app.rate_limit import INTERACTIVE_PRIORITY
+from app.rate_limit import TokenBucket
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+rpc_priority: ContextVar[int] = ContextVar('rpc_priority', default=BULK_PRIORITY)
+
+
+@contextmanager
+def interactive_priority(enabled: bool = True) -> Iterator[None]:
+    if not enabled:
+        yield
+        return
+    token = rpc_priority.set(INTERACTIVE_PRIORITY)
+    try:
+        yield
+    finally:
+        rpc_priority.reset(token)
+
+
+def request_method(request: Any) -> str:
+    if isinstance(request, (list, tuple)):
+        request = request[0] if request else None
+    name = type(request).__name__.removesuffix('Request')
+    namespace = type(request).__module__.rsplit('.', 1)[-1]
+    if namespace == 'functions':
+        return name
+    return f'{namespace}.{name}'
+
+
+class RpcScheduler:
+    def __init__(
+        self,
+        limits: dict[str, tuple[float, int]],
+        *,
+        default_limit: tuple[float, int],
+        max_flood_wait: int,
+        max_retries: int,
+        on_flood_wait: Callable[[int, int], bool] | None = None,
+    ) -> None:
+        self.limits = limits
+        self.default_limit = default_limit
+        self.max_flood_wait = max_flood_wait
+        self.max_retries = max_retries
+        self.on_flood_wait = on_flood_wait
+        self.buckets: dict[tuple[int, str], TokenBucket] = {}
+        self.interactive_calls: dict[int, int] = {}
+        self.account_gates: dict[int, asyncio.Event] = {}
+        self.counters = {
+            'calls': 0,
+            'throttled': 0,
+            'throttled_seconds': 0.0,
+            'flood_waits': 0,
+            'flood_wait_seconds': 0,
+            'retries': 0,
+            'gave_up': 0,
+            'handed_off': 0,
+            'yielded': 0,
+        }
+
+    def bucket(self, account_key: int, method: str) -> TokenBucket:
+        key = (account_key, method)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate, capacity = self.limits.get(method, self.default_limit)
+            bucket = TokenBucket(rate, capacity)
+            self.buckets[key] = bucket
+        return bucket
+
+    def account_gate(self, account_key: int) -> asyncio.Event:
+        gate = self.account_gates.get(account_key)
+        if gate is None:
+            gate = asyncio.Event()
+            gate.set()
+            self.account_gates[account_key] = gate
+        return gate
+
+    async def call(
+        self,
+        account_key: int,
+        method: str,
+        operation: Callable[[], Awaitable[T]],
+    ) -> T:
+        bucket = self.bucket(account_key, method)
+        priority = rpc_priority.get()
+        gate = self.account_gate(account_key)
+        interactive = priority == INTERACTIVE_PRIORITY
+        if interactive:
+            self.interactive_calls[account_key] = self.interactive_calls.get(account_key, 0) + 1
+            gate.clear()
+        try:
+            return await self.run(account_key, bucket, gate, method, priority, operation)
+        finally:
+            if interactive:
+                self.interactive_calls[account_key] -= 1
+                if not self.interactive_calls[account_key]:
+                    gate.set()
+
+    async def run(
+        self,
+        account_key: int,
+        bucket: TokenBucket,
+        gate: asyncio.Event,
+        method: str,
+        priority: int,
+        operation: Callable[[], Awaitable[T]],
+    ) -> T:
+        attempt = 0
+        while True:
+            waited = await bucket.acquire(priority)
+            if priority != INTERACTIVE_PRIORITY and not gate.is_set():
+                # Buckets are per method, so bulk calls of any method on this
+                # account give way to its pending interactive calls here.
+                self.counters['yielded'] += 1
+                started = time.monotonic()
+                await gate.wait()
+                waited += time.monotonic() - started
+            self.counters['calls'] += 1
+            if waited > 0.001:
+                self.counters['throttled'] += 1
+                self.counters['throttled_seconds'] += waited
+            try:
+                return await operation()
+            except FloodWaitError as exc:
+                self.counters['flood_waits'] += 1
+                self.counters['flood_wait_seconds'] += exc.seconds
+                await bucket.block(exc.seconds)
+                if self.on_flood_wait is not None and self.on_flood_wait(account_key, exc.seconds):
+                    # The account is out of rotation now; the caller moves to another one
+                    # instead of sleeping here while the rest of the pool sits idle.
+                    self.counters['handed_off'] += 1
+                    raise
+                if exc.seconds > self.max_flood_wait or attempt >= self.max_retries:
+                    self.counters['gave_up'] += 1
+                    raise
+                logger.info('Flood wait %ss on %s, retrying', exc.seconds, method)
+                attempt += 1
+                self.counters['retries'] += 1
+
+    def stats(self) -> dict[str, Any]:
+        stats = dict(self.counters)
+        stats['throttled_seconds'] = round(stats['throttled_seconds'], 3)
+        return stats
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
+from typing import Literal
 
 from pydantic import BaseModel
 from pydantic import ConfigDict
@@ -98,6 +99,29 @@ class HashtagAnalysisRequest(BaseModel):
     end_date: datetime
     channel_ids: list[int] | None = None
     max_messages_per_channel: int | None = None
+    stream: bool = False
+    memoize: bool = False
+    token_budget: int | None = Field(default=None, gt=0)
+    chunk_planner: Literal['greedy', 'tight', 'balanced'] = 'greedy'
+    ordered_chunks: bool = True
+
+
+class ChannelFetchReport(BaseModel):
+    channel_id: int
+    messages: int
+    duration_seconds: float
+    flood_wait_seconds: int
+    error: str | None
+
+
+class ChunkPlanReport(BaseModel):
+    planner: str
+    requests: int
+    fill_ratio: float
+    min_chunk_tokens: int
+    max_chunk_tokens: int
+    greedy_requests: int
+    greedy_fill_ratio: float
 
 
 class HashtagAnalysisResponse(BaseModel):
@@ -106,7 +130,36 @@ class HashtagAnalysisResponse(BaseModel):
     end_date: datetime
     channels: list[int]
     total_messages: int
+    memoized_messages: int = 0
+    vocabulary_version: str | None = None
+    tokens_used: int = 0
+    chunk_plan: ChunkPlanReport | None = None
+    total_chunks: int = 0
+    failed_chunks: list[int] = Field(default_factory=list)
     hashtags: list[HashtagFrequency]
+    channel_reports: list[ChannelFetchReport] = Field(default_factory=list)
+
+
+class UsageReportRow(BaseModel):
+    prompt_id: int | None = None
+    day: datetime | None = None
+    channel_ids: list[int] | None = None
+    requests: int
+    cached_responses: int
+    errors: int
+    input_tokens: int
+    output_tokens: int
+    cached_tokens: int
+    retries: int
+    latency_ms_avg: float
+    latency_ms_p95: float
+
+
+class UsageReport(BaseModel):
+    start_date: datetime
+    end_date: datetime
+    group_by: list[str]
+    items: list[UsageReportRow]
 
 
 class ParticipantChannel(BaseModel):
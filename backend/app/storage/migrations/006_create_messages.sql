@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS messages (
+    channel_id BIGINT NOT NULL REFERENCES channels(id) ON DELETE CASCADE,
+    message_id BIGINT NOT NULL,
+    user_id BIGINT,
+    date TIMESTAMPTZ NOT NULL,
+    text TEXT NOT NULL,
+    reply_to JSONB,
+    forwarded JSONB,
+    PRIMARY KEY (channel_id, message_id)
+);
+
+CREATE INDEX IF NOT EXISTS messages_channel_date_idx
+    ON messages (channel_id, date);
@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS channel_sync_state (
+    channel_id BIGINT PRIMARY KEY REFERENCES channels(id) ON DELETE CASCADE,
+    last_message_id BIGINT NOT NULL DEFAULT 0,
+    synced_from TIMESTAMPTZ NOT NULL,
+    synced_until TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
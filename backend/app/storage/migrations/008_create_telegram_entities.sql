@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS telegram_entities (
+    account_id BIGINT NOT NULL,
+    entity_id BIGINT NOT NULL,
+    kind VARCHAR NOT NULL,
+    username VARCHAR,
+    access_hash BIGINT,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (account_id, entity_id)
+);
+
+CREATE INDEX IF NOT EXISTS telegram_entities_username_idx
+    ON telegram_entities (account_id, username);
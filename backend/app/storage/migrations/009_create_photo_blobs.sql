@@ -0,0 +1,35 @@
+CREATE TABLE IF NOT EXISTS photo_blobs (
+    hash VARCHAR PRIMARY KEY,
+    mime VARCHAR,
+    data BYTEA NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE participants ADD COLUMN IF NOT EXISTS photo_id BIGINT;
+ALTER TABLE participants ADD COLUMN IF NOT EXISTS photo_hash VARCHAR REFERENCES photo_blobs(hash);
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'participants'
+          AND column_name = 'photo_bytes'
+    ) THEN
+        INSERT INTO photo_blobs (hash, mime, data)
+        SELECT DISTINCT ON (encode(sha256(photo_bytes), 'hex'))
+               encode(sha256(photo_bytes), 'hex'),
+               photo_mime,
+               photo_bytes
+        FROM participants
+        WHERE photo_bytes IS NOT NULL
+        ON CONFLICT (hash) DO NOTHING;
+
+        UPDATE participants
+        SET photo_hash = encode(sha256(photo_bytes), 'hex')
+        WHERE photo_bytes IS NOT NULL;
+
+        ALTER TABLE participants DROP COLUMN photo_bytes;
+        ALTER TABLE participants DROP COLUMN photo_mime;
+    END IF;
+END $$;
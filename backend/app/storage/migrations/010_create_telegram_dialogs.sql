@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS telegram_dialogs (
+    account_id BIGINT NOT NULL,
+    entity_id BIGINT NOT NULL,
+    kind VARCHAR NOT NULL,
+    username VARCHAR,
+    title VARCHAR,
+    access_hash BIGINT,
+    top_message_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (account_id, entity_id)
+);
@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS channel_backfill_checkpoints (
+    channel_id BIGINT PRIMARY KEY REFERENCES channels(id) ON DELETE CASCADE,
+    target_date TIMESTAMPTZ NOT NULL,
+    offset_id BIGINT NOT NULL DEFAULT 0,
+    oldest_date TIMESTAMPTZ,
+    messages BIGINT NOT NULL DEFAULT 0,
+    completed BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS llm_response_cache (
+    key CHAR(64) PRIMARY KEY,
+    model VARCHAR NOT NULL,
+    content TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    hits BIGINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    last_used_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used_at
+    ON llm_response_cache (last_used_at DESC);
@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS message_hashtags (
+    channel_id BIGINT NOT NULL REFERENCES channels(id) ON DELETE CASCADE,
+    message_id BIGINT NOT NULL,
+    prompt_id BIGINT NOT NULL REFERENCES analysis_prompts(id) ON DELETE CASCADE,
+    prompt_version CHAR(16) NOT NULL,
+    vocabulary_version CHAR(16) NOT NULL,
+    text_hash CHAR(16) NOT NULL,
+    tags TEXT[] NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (channel_id, message_id, prompt_id, prompt_version, vocabulary_version)
+);
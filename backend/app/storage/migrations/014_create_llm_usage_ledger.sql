@@ -0,0 +1,18 @@
+CREATE TABLE IF NOT EXISTS llm_usage_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    analysis_id UUID,
+    prompt_id BIGINT,
+    channel_ids BIGINT[] NOT NULL DEFAULT '{}',
+    chunk_index INTEGER,
+    model VARCHAR NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    latency_ms INTEGER NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    cached_response BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_usage_ledger_created_at
+    ON llm_usage_ledger (created_at);
@@ -0,0 +1 @@
+ALTER TABLE telegram_entities ADD COLUMN IF NOT EXISTS title VARCHAR;
@@ -0,0 +1 @@
+ALTER TABLE llm_usage_ledger ADD COLUMN IF NOT EXISTS error BOOLEAN NOT NULL DEFAULT FALSE;
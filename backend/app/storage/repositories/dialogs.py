@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from typing import Any
+
+from app.storage.database import Database
+
+
+class DialogsRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def list_for_account(self, account_id: int) -> list[dict[str, Any]]:
+        rows = await self.db.fetch(
+            """
+            SELECT entity_id, kind, username, title, access_hash, top_message_id
+            FROM telegram_dialogs
+            WHERE account_id = $1
+            """,
+            account_id,
+        )
+        return [dict(row) for row in rows]
+
+    async def upsert_many(self, account_id: int, dialogs: list[dict[str, Any]]) -> None:
+        if not dialogs:
+            return
+        query = """
+            INSERT INTO telegram_dialogs (
+                account_id,
+                entity_id,
+                kind,
+                username,
+                title,
+                access_hash,
+                top_message_id
+            )
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            ON CONFLICT (account_id, entity_id) DO UPDATE SET
+                kind = EXCLUDED.kind,
+                username = EXCLUDED.username,
+                title = EXCLUDED.title,
+                access_hash = EXCLUDED.access_hash,
+                top_message_id = EXCLUDED.top_message_id,
+                updated_at = NOW()
+        """
+        args = [
+            (
+                account_id,
+                item['entity_id'],
+                item['kind'],
+                item.get('username'),
+                item.get('title'),
+                item.get('access_hash'),
+                item.get('top_message_id') or 0,
+            )
+            for item in dialogs
+        ]
+        await self.db.executemany(query, args)
+
+    async def delete_many(self, account_id: int, entity_ids: list[int]) -> None:
+        if not entity_ids:
+            return
+        await self.db.execute(
+            """
+            DELETE FROM telegram_dialogs
+            WHERE account_id = $1
+              AND entity_id = ANY($2::BIGINT[])
+            """,
+            account_id,
+            entity_ids,
+        )
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from typing import Any
+
+from app.storage.database import Database
+
+
+class EntitiesRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def list_for_account(self, account_id: int) -> list[dict[str, Any]]:
+        rows = await self.db.fetch(
+            """
+            SELECT entity_id, kind, username, access_hash, title
+            FROM telegram_entities
+            WHERE account_id = $1
+            """,
+            account_id,
+        )
+        return [dict(row) for row in rows]
+
+    async def upsert_many(self, account_id: int, entities: list[dict[str, Any]]) -> None:
+        if not entities:
+            return
+        query = """
+            INSERT INTO telegram_entities (
+                account_id,
+                entity_id,
+                kind,
+                username,
+                access_hash,
+                title
+            )
+            VALUES ($1, $2, $3, $4, $5, $6)
+            ON CONFLICT (account_id, entity_id) DO UPDATE SET
+                kind = EXCLUDED.kind,
+                username = EXCLUDED.username,
+                access_hash = EXCLUDED.access_hash,
+                title = EXCLUDED.title,
+                updated_at = NOW()
+        """
+        args = [
+            (
+                account_id,
+                item['entity_id'],
+                item['kind'],
+                item.get('username'),
+                item.get('access_hash'),
+                item.get('title'),
+            )
+            for item in entities
+        ]
+        await self.db.executemany(query, args)
+
+    async def delete(self, account_id: int, entity_id: int) -> None:
+        await self.db.execute(
+            """
+            DELETE FROM telegram_entities
+            WHERE account_id = $1
+              AND entity_id = $2
+            """,
+            account_id,
+            entity_id,
+        )
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from app.storage.database import Database
+
+
+class MessageTagsRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def get_many(
+        self,
+        prompt_id: int,
+        prompt_version: str,
+        vocabulary_version: str,
+        messages: list[tuple[int, int, str]],
+    ) -> dict[tuple[int, int], list[str]]:
+        if not messages:
+            return {}
+        rows = await self.db.fetch(
+            """
+            SELECT stored.channel_id, stored.message_id, stored.tags
+            FROM message_hashtags AS stored
+            JOIN UNNEST($4::BIGINT[], $5::BIGINT[], $6::TEXT[]) AS requested (channel_id, message_id, text_hash)
+              ON stored.channel_id = requested.channel_id
+             AND stored.message_id = requested.message_id
+             AND stored.text_hash = requested.text_hash
+            WHERE stored.prompt_id = $1
+              AND stored.prompt_version = $2
+              AND stored.vocabulary_version = $3
+            """,
+            prompt_id,
+            prompt_version,
+            vocabulary_version,
+            [item[0] for item in messages],
+            [item[1] for item in messages],
+            [item[2] for item in messages],
+        )
+        return {(int(row['channel_id']), int(row['message_id'])): list(row['tags']) for row in rows}
+
+    async def save_many(
+        self,
+        prompt_id: int,
+        prompt_version: str,
+        vocabulary_version: str,
+        results: list[tuple[int, int, str, list[str]]],
+    ) -> None:
+        if not results:
+            return
+        query = """
+            INSERT INTO message_hashtags (
+                channel_id,
+                message_id,
+                prompt_id,
+                prompt_version,
+                vocabulary_version,
+                text_hash,
+                tags
+            )
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            ON CONFLICT (channel_id, message_id, prompt_id, prompt_version, vocabulary_version) DO UPDATE SET
+                text_hash = EXCLUDED.text_hash,
+                tags = EXCLUDED.tags,
+                created_at = NOW()
+        """
+        args = [
+            (channel_id, message_id, prompt_id, prompt_version, vocabulary_version, text_hash, tags)
+            for channel_id, message_id, text_hash, tags in results
+        ]
+        await self.db.executemany(query, args)
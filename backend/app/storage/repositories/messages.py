@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+from typing import AsyncIterator
+import json
+
+from app.message_records import ForwardRecord
+from app.message_records import MessageRecord
+from app.message_records import ReplyRecord
+from app.message_records import record_to_dict
+from app.storage.database import Database
+
+
+def dump_json(value: Any) -> str | None:
+    if not value:
+        return None
+    return json.dumps(value)
+
+
+def load_json(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+class MessagesRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    def row_to_record(self, row: Any) -> MessageRecord:
+        reply_to = load_json(row['reply_to'])
+        forwarded = load_json(row['forwarded'])
+        return MessageRecord(
+            row['channel_id'],
+            row['message_id'],
+            row['user_id'],
+            row['date'],
+            row['text'],
+            ReplyRecord(**reply_to) if reply_to else None,
+            ForwardRecord(**forwarded) if forwarded else None,
+        )
+
+    async def upsert_many(self, messages: list[MessageRecord]) -> None:
+        if not messages:
+            return
+        query = """
+            INSERT INTO messages (
+                channel_id,
+                message_id,
+                user_id,
+                date,
+                text,
+                reply_to,
+                forwarded
+            )
+            VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7::jsonb)
+            ON CONFLICT (channel_id, message_id) DO UPDATE SET
+                user_id = EXCLUDED.user_id,
+                date = EXCLUDED.date,
+                text = EXCLUDED.text,
+                reply_to = EXCLUDED.reply_to,
+                forwarded = EXCLUDED.forwarded
+        """
+        args: list[tuple[Any, ...]] = []
+        for item in messages:
+            args.append(
+                (
+                    item.channel_id,
+                    item.message_id,
+                    item.user_id,
+                    item.date,
+                    item.text,
+                    dump_json(record_to_dict(item.reply_to)),
+                    dump_json(record_to_dict(item.forwarded)),
+                ),
+            )
+        await self.db.executemany(query, args)
+
+    async def list_window(
+        self,
+        channel_ids: list[int],
+        *,
+        start_date: datetime,
+        end_date: datetime,
+        max_per_channel: int | None = None,
+    ) -> list[MessageRecord]:
+        rows = await self.db.fetch(
+            """
+            SELECT channel_id,
+                   message_id,
+                   user_id,
+                   date,
+                   text,
+                   reply_to,
+                   forwarded
+            FROM (
+                SELECT messages.*,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY channel_id
+                           ORDER BY date DESC, message_id DESC
+                       ) AS position
+                FROM messages
+                WHERE channel_id = ANY($1::BIGINT[])
+                  AND date >= $2
+                  AND date <= $3
+            ) AS window_messages
+            WHERE $4::BIGINT IS NULL OR position <= $4
+            ORDER BY date ASC, channel_id ASC, message_id ASC
+            """,
+            channel_ids,
+            start_date,
+            end_date,
+            max_per_channel,
+        )
+        return [self.row_to_record(row) for row in rows]
+
+    async def iter_channel_window(
+        self,
+        channel_id: int,
+        *,
+        start_date: datetime,
+        end_date: datetime,
+        max_per_channel: int | None = None,
+        page_size: int = 1000,
+    ) -> AsyncIterator[list[MessageRecord]]:
+        cursor_date = start_date
+        cursor_id = -1
+        if max_per_channel:
+            floor = await self.db.fetchrow(
+                """
+                SELECT date, message_id
+                FROM messages
+                WHERE channel_id = $1
+                  AND date >= $2
+                  AND date <= $3
+                ORDER BY date DESC, message_id DESC
+                OFFSET $4
+                LIMIT 1
+                """,
+                channel_id,
+                start_date,
+                end_date,
+                max_per_channel - 1,
+            )
+            if floor:
+                cursor_date = floor['date']
+                cursor_id = floor['message_id'] - 1
+        while True:
+            rows = await self.db.fetch(
+                """
+                SELECT channel_id,
+                       message_id,
+                       user_id,
+                       date,
+                       text,
+                       reply_to,
+                       forwarded
+                FROM messages
+                WHERE channel_id = $1
+                  AND (date, message_id) > ($2, $3)
+                  AND date <= $4
+                ORDER BY date ASC, message_id ASC
+                LIMIT $5
+                """,
+                channel_id,
+                cursor_date,
+                cursor_id,
+                end_date,
+                page_size,
+            )
+            if not rows:
+                return
+            yield [self.row_to_record(row) for row in rows]
+            if len(rows) < page_size:
+                return
+            cursor_date = rows[-1]['date']
+            cursor_id = rows[-1]['message_id']
+
+    async def get_sync_states(self, channel_ids: list[int]) -> dict[int, dict[str, Any]]:
+        if not channel_ids:
+            return {}
+        rows = await self.db.fetch(
+            """
+            SELECT channel_id, last_message_id, synced_from, synced_until
+            FROM channel_sync_state
+            WHERE channel_id = ANY($1::BIGINT[])
+            """,
+            channel_ids,
+        )
+        return {int(row['channel_id']): dict(row) for row in rows}
+
+    async def save_sync_states(self, states: list[dict[str, Any]]) -> None:
+        if not states:
+            return
+        query = """
+            INSERT INTO channel_sync_state (
+                channel_id,
+                last_message_id,
+                synced_from,
+                synced_until
+            )
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (channel_id) DO UPDATE SET
+                last_message_id = GREATEST(channel_sync_state.last_message_id, EXCLUDED.last_message_id),
+                synced_from = LEAST(channel_sync_state.synced_from, EXCLUDED.synced_from),
+                synced_until = GREATEST(channel_sync_state.synced_until, EXCLUDED.synced_until),
+                updated_at = NOW()
+        """
+        args = [
+            (
+                state['channel_id'],
+                state['last_message_id'],
+                state['synced_from'],
+                state['synced_until'],
+            )
+            for state in states
+        ]
+        await self.db.executemany(query, args)
+
+    async def get_backfill_checkpoint(self, channel_id: int) -> dict[str, Any] | None:
+        row = await self.db.fetchrow(
+            """
+            SELECT channel_id, target_date, offset_id, oldest_date, messages, completed
+            FROM channel_backfill_checkpoints
+            WHERE channel_id = $1
+            """,
+            channel_id,
+        )
+        return dict(row) if row else None
+
+    async def save_backfill_checkpoint(self, checkpoint: dict[str, Any]) -> None:
+        await self.db.execute(
+            """
+            INSERT INTO channel_backfill_checkpoints (
+                channel_id,
+                target_date,
+                offset_id,
+                oldest_date,
+                messages,
+                completed
+            )
+            VALUES ($1, $2, $3, $4, $5, $6)
+            ON CONFLICT (channel_id) DO UPDATE SET
+                target_date = EXCLUDED.target_date,
+                offset_id = EXCLUDED.offset_id,
+                oldest_date = EXCLUDED.oldest_date,
+                messages = EXCLUDED.messages,
+                completed = EXCLUDED.completed,
+                updated_at = NOW()
+            """,
+            checkpoint['channel_id'],
+            checkpoint['target_date'],
+            checkpoint['offset_id'],
+            checkpoint.get('oldest_date'),
+            checkpoint['messages'],
+            checkpoint['completed'],
+        )
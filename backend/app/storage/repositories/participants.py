@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from typing import Any
 import base64
+import hashlib
 
 from app.storage.database import Database
 
@@ -27,16 +28,17 @@ class ParticipantsRepository:
     async def list(self, limit: int, offset: int) -> tuple[list[dict[str, Any]], int]:
         rows = await self.db.fetch(
             """
-            SELECT user_id,
-                   username,
+            SELECT participants.user_id,
+                   participants.username,
                    first_name,
                    last_name,
                    display_name,
                    about,
-                   photo_bytes,
-                   photo_mime
+                   photo_blobs.data AS photo_bytes,
+                   photo_blobs.mime AS photo_mime
             FROM participants
-            ORDER BY user_id DESC
+            LEFT JOIN photo_blobs ON photo_blobs.hash = participants.photo_hash
+            ORDER BY participants.user_id DESC
             LIMIT $1 OFFSET $2
             """,
             limit,
@@ -48,16 +50,17 @@ class ParticipantsRepository:
     async def get_by_id(self, user_id: int) -> dict[str, Any] | None:
         row = await self.db.fetchrow(
             """
-            SELECT user_id,
-                   username,
+            SELECT participants.user_id,
+                   participants.username,
                    first_name,
                    last_name,
                    display_name,
                    about,
-                   photo_bytes,
-                   photo_mime
+                   photo_blobs.data AS photo_bytes,
+                   photo_blobs.mime AS photo_mime
             FROM participants
-            WHERE user_id = $1
+            LEFT JOIN photo_blobs ON photo_blobs.hash = participants.photo_hash
+            WHERE participants.user_id = $1
             """,
             user_id,
         )
@@ -109,9 +112,75 @@ class ParticipantsRepository:
         args: list[tuple[Any, ...]] = [(user_id,) for user_id in user_ids]
         await self.db.executemany(query, args)
 
+    async def get_photo_ids(self, user_ids: list[int]) -> dict[int, int]:
+        if not user_ids:
+            return {}
+        rows = await self.db.fetch(
+            """
+            SELECT user_id, photo_id
+            FROM participants
+            WHERE user_id = ANY($1::bigint[])
+              AND photo_id IS NOT NULL
+              AND photo_hash IS NOT NULL
+            """,
+            list(user_ids),
+        )
+        return {int(row["user_id"]): int(row["photo_id"]) for row in rows}
+
+    async def store_photo_blobs(self, blobs: dict[str, tuple[bytes, str | None]]) -> None:
+        if not blobs:
+            return
+        rows = await self.db.fetch(
+            """
+            SELECT hash
+            FROM photo_blobs
+            WHERE hash = ANY($1::varchar[])
+            """,
+            list(blobs),
+        )
+        stored = {row["hash"] for row in rows}
+        query = """
+            INSERT INTO photo_blobs (
+                hash,
+                mime,
+                data
+            )
+            VALUES ($1, $2, $3)
+            ON CONFLICT (hash) DO NOTHING
+        """
+        args = [
+            (photo_hash, photo_mime, photo_bytes)
+            for photo_hash, (photo_bytes, photo_mime) in blobs.items()
+            if photo_hash not in stored
+        ]
+        if args:
+            await self.db.executemany(query, args)
+
     async def upsert_details(self, participants: list[dict[str, Any]]) -> None:
         if not participants:
             return
+        blobs: dict[str, tuple[bytes, str | None]] = {}
+        args: list[tuple[Any, ...]] = []
+        for item in participants:
+            photo_bytes = item.get("photo_bytes")
+            photo_hash = None
+            if photo_bytes:
+                photo_hash = hashlib.sha256(photo_bytes).hexdigest()
+                blobs[photo_hash] = (photo_bytes, item.get("photo_mime"))
+            args.append(
+                (
+                    item["user_id"],
+                    item.get("username"),
+                    item.get("first_name"),
+                    item.get("last_name"),
+                    item.get("display_name"),
+                    item.get("about"),
+                    item.get("photo_id") if photo_hash else None,
+                    photo_hash,
+                    bool(item.get("keep_photo")),
+                ),
+            )
+        await self.store_photo_blobs(blobs)
         query = """
             INSERT INTO participants (
                 user_id,
@@ -120,8 +189,8 @@ class ParticipantsRepository:
                 last_name,
                 display_name,
                 about,
-                photo_bytes,
-                photo_mime
+                photo_id,
+                photo_hash
             )
             VALUES (
                 $1, $2, $3, $4, $5, $6,
@@ -133,23 +202,9 @@ class ParticipantsRepository:
                 last_name = EXCLUDED.last_name,
                 display_name = EXCLUDED.display_name,
                 about = EXCLUDED.about,
-                photo_bytes = EXCLUDED.photo_bytes,
-                photo_mime = EXCLUDED.photo_mime
+                photo_id = CASE WHEN $9 THEN participants.photo_id ELSE EXCLUDED.photo_id END,
+                photo_hash = CASE WHEN $9 THEN participants.photo_hash ELSE EXCLUDED.photo_hash END
         """
-        args: list[tuple[Any, ...]] = []
-        for item in participants:
-            args.append(
-                (
-                    item["user_id"],
-                    item.get("username"),
-                    item.get("first_name"),
-                    item.get("last_name"),
-                    item.get("display_name"),
-                    item.get("about"),
-                    item.get("photo_bytes"),
-                    item.get("photo_mime"),
-                ),
-            )
         await self.db.executemany(query, args)
 
     async def upsert_channel_links(self, pairs: set[tuple[int, int]]) -> None:
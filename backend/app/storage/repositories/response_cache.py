@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from app.storage.database import Database
+
+
+class ResponseCacheRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def get(self, key: str) -> str | None:
+        return await self.db.fetchval(
+            """
+            UPDATE llm_response_cache
+            SET hits = hits + 1,
+                last_used_at = NOW()
+            WHERE key = $1
+            RETURNING content
+            """,
+            key,
+        )
+
+    async def put(self, key: str, model: str, content: str) -> None:
+        await self.db.execute(
+            """
+            INSERT INTO llm_response_cache (key, model, content, size_bytes)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (key) DO UPDATE SET
+                content = EXCLUDED.content,
+                size_bytes = EXCLUDED.size_bytes,
+                last_used_at = NOW()
+            """,
+            key,
+            model,
+            content,
+            len(content.encode()),
+        )
+
+    async def evict(self, max_bytes: int) -> int:
+        status = await self.db.execute(
+            """
+            DELETE FROM llm_response_cache
+            WHERE key IN (
+                SELECT key
+                FROM (
+                    SELECT key,
+                           SUM(size_bytes) OVER (ORDER BY last_used_at DESC, key) AS retained
+                    FROM llm_response_cache
+                ) AS ranked
+                WHERE retained > $1
+            )
+            """,
+            max_bytes,
+        )
+        return int(status.rsplit(' ', 1)[-1])
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from app.storage.database import Database
+
+
+USAGE_GROUPS = {
+    'prompt': 'prompt_id',
+    'day': "date_trunc('day', created_at) AS day",
+    'channels': 'channel_ids',
+}
+
+
+class UsageLedgerRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def insert_many(self, entries: list[dict[str, Any]]) -> None:
+        if not entries:
+            return
+        query = """
+            INSERT INTO llm_usage_ledger (
+                created_at,
+                analysis_id,
+                prompt_id,
+                channel_ids,
+                chunk_index,
+                model,
+                input_tokens,
+                output_tokens,
+                cached_tokens,
+                latency_ms,
+                retries,
+                cached_response,
+                error
+            )
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
+        """
+        args = [
+            (
+                item['created_at'],
+                item.get('analysis_id'),
+                item.get('prompt_id'),
+                sorted(item.get('channel_ids') or []),
+                item.get('chunk_index'),
+                item['model'],
+                item['input_tokens'],
+                item['output_tokens'],
+                item['cached_tokens'],
+                item['latency_ms'],
+                item['retries'],
+                item['cached_response'],
+                item.get('error', False),
+            )
+            for item in entries
+        ]
+        await self.db.executemany(query, args)
+
+    async def aggregate(
+        self,
+        group_by: list[str],
+        *,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> list[dict[str, Any]]:
+        columns = [USAGE_GROUPS[name] for name in group_by]
+        keys = [column.rsplit(' ', 1)[-1] for column in columns]
+        select = ''.join(f'{column},\n' for column in columns)
+        grouping = f"GROUP BY {', '.join(keys)}\nORDER BY {', '.join(keys)}" if keys else ''
+        rows = await self.db.fetch(
+            f"""
+            SELECT {select}
+                   COUNT(*) AS requests,
+                   COUNT(*) FILTER (WHERE cached_response) AS cached_responses,
+                   COUNT(*) FILTER (WHERE error) AS errors,
+                   COALESCE(SUM(input_tokens), 0) AS input_tokens,
+                   COALESCE(SUM(output_tokens), 0) AS output_tokens,
+                   COALESCE(SUM(cached_tokens), 0) AS cached_tokens,
+                   COUNT(*) FILTER (WHERE retries > 0) AS retries,
+                   COALESCE(AVG(latency_ms) FILTER (WHERE NOT cached_response), 0) AS latency_ms_avg,
+                   COALESCE(
+                       PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY latency_ms)
+                           FILTER (WHERE NOT cached_response),
+                       0
+                   ) AS latency_ms_p95
+            FROM llm_usage_ledger
+            WHERE created_at >= $1
+              AND created_at < $2
+            {grouping}
+            """,
+            start_date,
+            end_date,
+        )
+        return [dict(row) for row in rows]
@@ -2,18 +2,30 @@ from __future__ import annotations
 
 from app.storage.database import Database
 from app.storage.repositories.channels import ChannelsRepository
+from app.storage.repositories.dialogs import DialogsRepository
+from app.storage.repositories.entities import EntitiesRepository
 from app.storage.repositories.hashtags import HashtagsRepository
+from app.storage.repositories.message_tags import MessageTagsRepository
+from app.storage.repositories.messages import MessagesRepository
 from app.storage.repositories.participants import ParticipantsRepository
 from app.storage.repositories.prompts import PromptsRepository
+from app.storage.repositories.response_cache import ResponseCacheRepository
+from app.storage.repositories.usage_ledger import UsageLedgerRepository
 
 
 class Storage:
     def __init__(self, db: Database):
         self.db = db
         self.channels = ChannelsRepository(db)
+        self.dialogs = DialogsRepository(db)
+        self.entities = EntitiesRepository(db)
         self.hashtags = HashtagsRepository(db)
+        self.message_tags = MessageTagsRepository(db)
+        self.messages = MessagesRepository(db)
         self.participants = ParticipantsRepository(db)
         self.prompts = PromptsRepository(db)
+        self.response_cache = ResponseCacheRepository(db)
+        self.usage_ledger = UsageLedgerRepository(db)
 
     @classmethod
     async def create(cls, dsn: str) -> "Storage":
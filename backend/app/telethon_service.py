@@ -1,23 +1,85 @@
 from __future__ import annotations
 
+from contextlib import suppress
 from datetime import datetime
+from datetime import timedelta
 from datetime import timezone
 from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from typing import TypeVar
+import asyncio
 import logging
+import time
 
 from telethon import TelegramClient
 from telethon import functions
 from telethon import types
+from telethon.errors import ChannelInvalidError
+from telethon.errors import ChannelPrivateError
+from telethon.errors import FloodWaitError
+from telethon.errors import PeerIdInvalidError
 from telethon.errors import RPCError
+from telethon.errors import UserIdInvalidError
+from telethon.errors import UsernameInvalidError
+from telethon.errors import UsernameNotOccupiedError
 from telethon.sessions import StringSession
 
+from app.cache import TtlCache
 from app.config import TELEGRAM_API_HASH
 from app.config import TELEGRAM_API_ID
-from app.config import TELETHON_SESSION
+from app.config import TELETHON_SESSIONS
+from app.message_records import ForwardRecord
+from app.message_records import MessageRecord
+from app.message_records import ReplyRecord
+from app.rpc_scheduler import RpcScheduler
+from app.rpc_scheduler import interactive_priority
+from app.rpc_scheduler import request_method
+from app.storage.repositories.dialogs import DialogsRepository
+from app.storage.repositories.entities import EntitiesRepository
 
 
 logger = logging.getLogger(__name__)
 
+REPLY_BATCH_SIZE = 100
+MESSAGE_PAGE_SIZE = 500
+PROFILE_BATCH_SIZE = 50
+PROFILE_CONCURRENCY = 8
+RANGE_SPLIT_PARTS = 4
+RANGE_SPLIT_MIN_IDS = 5000
+PHOTO_TIMEOUT_SECONDS = 20
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL_SECONDS = 300
+DESCRIPTION_CACHE_SIZE = 2048
+DESCRIPTION_CACHE_TTL_SECONDS = 3600
+FLOOD_WAIT_LIMIT = 120
+RPC_MAX_RETRIES = 3
+RPC_DEFAULT_LIMIT = (5.0, 10)
+RPC_LIMITS = {
+    'contacts.ResolveUsername': (0.5, 5),
+    'contacts.Search': (0.5, 3),
+    'channels.GetFullChannel': (2.0, 5),
+    'users.GetFullUser': (2.0, 5),
+    'messages.GetHistory': (3.0, 10),
+    'messages.GetDialogs': (1.0, 3),
+    'InvokeWithTakeout': (10.0, 20),
+}
+
+T = TypeVar('T')
+
+NO_DESCRIPTION = object()
+
+STALE_PEER_ERRORS = (
+    ChannelInvalidError,
+    ChannelPrivateError,
+    PeerIdInvalidError,
+    UserIdInvalidError,
+    UsernameInvalidError,
+    UsernameNotOccupiedError,
+    ValueError,
+)
+
 
 def normalize_message_date(value: datetime) -> datetime:
     if value.tzinfo is None:
@@ -39,6 +101,10 @@ def chunked(values: list[int], size: int) -> list[list[int]]:
     return [values[i:i + size] for i in range(0, len(values), size)]
 
 
+def normalize_search_query(query: str) -> str:
+    return ' '.join(query.lower().lstrip('@').split())
+
+
 def guess_photo_mime(photo_bytes: bytes) -> str:
     if photo_bytes.startswith(b"\xff\xd8\xff"):
         return "image/jpeg"
@@ -64,150 +130,576 @@ def build_display_name(
     return str(user_id)
 
 
-class TelegramService:
+def build_peer_record(entity: Any) -> dict[str, Any] | None:
+    if getattr(entity, 'min', False):
+        return None
+    if isinstance(entity, (types.Channel, types.ChannelForbidden)):
+        kind = 'channel'
+    elif isinstance(entity, types.User):
+        kind = 'user'
+    elif isinstance(entity, types.Chat):
+        kind = 'chat'
+    else:
+        return None
+    access_hash = getattr(entity, 'access_hash', None)
+    if kind != 'chat' and access_hash is None:
+        return None
+    username = getattr(entity, 'username', None)
+    return {
+        'entity_id': int(entity.id),
+        'kind': kind,
+        'username': username.lower() if username else None,
+        'access_hash': access_hash,
+        'title': getattr(entity, 'title', None),
+    }
+
+
+def build_dialog_record(dialog: Any) -> dict[str, Any] | None:
+    entity = dialog.entity
+    entity_id = getattr(entity, 'id', None)
+    if entity_id is None:
+        return None
+    if isinstance(entity, (types.Channel, types.ChannelForbidden)):
+        kind = 'channel'
+    elif isinstance(entity, (types.Chat, types.ChatForbidden)):
+        kind = 'chat'
+    elif isinstance(entity, types.User):
+        kind = 'user'
+    else:
+        return None
+    username = getattr(entity, 'username', None)
+    title = getattr(entity, 'title', None)
+    if kind == 'user':
+        title = build_display_name(
+            first_name=entity.first_name,
+            last_name=entity.last_name,
+            username=username,
+            user_id=int(entity_id),
+        )
+    message = getattr(dialog, 'message', None)
+    return {
+        'entity_id': int(entity_id),
+        'kind': kind,
+        'username': username,
+        'title': title,
+        'access_hash': None if getattr(entity, 'min', False) else getattr(entity, 'access_hash', None),
+        'top_message_id': message.id if message is not None else 0,
+    }
+
+
+def merge_range_reports(channel_id: int, reports: list[dict[str, Any]]) -> dict[str, Any]:
+    newest = max(reports, key=lambda report: report.get('last_message_id') or 0)
+    return {
+        'channel_id': channel_id,
+        'messages': sum(report['messages'] for report in reports),
+        'duration_seconds': max(report['duration_seconds'] for report in reports),
+        'flood_wait_seconds': sum(report['flood_wait_seconds'] for report in reports),
+        'error': next((report['error'] for report in reports if report.get('error')), None),
+        'last_message_id': newest.get('last_message_id'),
+        'last_message_date': newest.get('last_message_date'),
+    }
+
+
+def build_input_peer(record: dict[str, Any]) -> types.TypeInputPeer:
+    if record['kind'] == 'channel':
+        return types.InputPeerChannel(record['entity_id'], record['access_hash'])
+    if record['kind'] == 'user':
+        return types.InputPeerUser(record['entity_id'], record['access_hash'])
+    return types.InputPeerChat(record['entity_id'])
+
+
+class PeerCache:
     def __init__(self) -> None:
-        self.client = TelegramClient(
-            StringSession(TELETHON_SESSION),
-            TELEGRAM_API_ID,
-            TELEGRAM_API_HASH,
+        self.records: dict[int, dict[str, Any]] = {}
+        self.usernames: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, record: dict[str, Any]) -> bool:
+        entity_id = int(record['entity_id'])
+        previous = self.records.get(entity_id)
+        if previous == record:
+            return False
+        if previous and previous.get('username'):
+            self.usernames.pop(previous['username'], None)
+        self.records[entity_id] = record
+        if record.get('username'):
+            self.usernames[record['username']] = entity_id
+        return True
+
+    def remove(self, entity_id: int) -> None:
+        record = self.records.pop(int(entity_id), None)
+        if record and record.get('username'):
+            self.usernames.pop(record['username'], None)
+
+    def get(self, entity_id: int) -> types.TypeInputPeer | None:
+        record = self.records.get(int(entity_id))
+        return build_input_peer(record) if record else None
+
+    def find_by_username(self, username: str) -> dict[str, Any] | None:
+        entity_id = self.usernames.get(username.lower())
+        return self.records.get(entity_id) if entity_id is not None else None
+
+    def get_by_username(self, username: str) -> types.TypeInputPeer | None:
+        record = self.find_by_username(username)
+        return build_input_peer(record) if record else None
+
+
+class ScheduledTelegramClient(TelegramClient):
+    def __init__(self, *args: Any, scheduler: RpcScheduler, **kwargs: Any) -> None:
+        # Flood waits are handled by the scheduler so that they are counted and
+        # shared by every caller of the same method, not slept through silently.
+        super().__init__(*args, flood_sleep_threshold=0, **kwargs)
+        self.scheduler = scheduler
+
+    async def __call__(self, request: Any, ordered: bool = False, flood_sleep_threshold: int | None = None) -> Any:
+        return await self.scheduler.call(
+            id(self),
+            request_method(request),
+            lambda: TelegramClient.__call__(self, request, ordered, flood_sleep_threshold),
         )
 
+
+class TelegramAccount:
+    def __init__(
+        self,
+        client: TelegramClient,
+        entities: EntitiesRepository | None = None,
+        dialogs: DialogsRepository | None = None,
+    ) -> None:
+        self.client = client
+        self.entities = entities
+        self.dialogs = dialogs
+        self.peer_cache = PeerCache()
+        self.account_id: int | None = None
+        self.warm_lock = asyncio.Lock()
+        self.cooldown_until = 0.0
+        self.dialog_snapshot: dict[int, dict[str, Any]] | None = None
+        self.dialog_lock = asyncio.Lock()
+
+    def is_available(self, now: float | None = None) -> bool:
+        return self.cooldown_until <= (time.monotonic() if now is None else now)
+
+    def cool_down(self, seconds: int) -> None:
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+        logger.warning('Telegram account %s is cooling down for %ss', self.account_id, seconds)
+
     async def start(self) -> None:
         if not self.client.is_connected():
             await self.client.connect()
+        if self.account_id is None:
+            await self.warm_entity_cache()
 
     async def close(self) -> None:
         await self.client.disconnect()
 
+    async def warm_entity_cache(self) -> None:
+        async with self.warm_lock:
+            if self.account_id is not None:
+                return
+            try:
+                me = await self.client.get_me(input_peer=True)
+            except (RPCError, Exception) as exc:
+                logger.warning('Telethon failed to identify the account: %s', exc)
+                return
+            self.account_id = int(me.user_id) if me else 0
+            if self.entities is None or not self.account_id:
+                return
+            try:
+                records = await self.entities.list_for_account(self.account_id)
+            except Exception as exc:
+                logger.warning('Failed to load entity cache: %s', exc)
+                return
+            for record in records:
+                self.peer_cache.add(record)
+            logger.info(
+                'Entity cache of account %s warmed with %s peers',
+                self.account_id,
+                len(self.peer_cache),
+            )
+
+    async def remember_entities(self, entities: list[Any]) -> None:
+        changed: list[dict[str, Any]] = []
+        for entity in entities:
+            record = build_peer_record(entity)
+            if record and self.peer_cache.add(record):
+                changed.append(record)
+        if not changed or self.entities is None or not self.account_id:
+            return
+        try:
+            await self.entities.upsert_many(self.account_id, changed)
+        except Exception as exc:
+            logger.warning('Failed to persist %s cached entities: %s', len(changed), exc)
+
+    async def load_dialog_snapshot(self) -> dict[int, dict[str, Any]]:
+        if self.dialog_snapshot is not None:
+            return self.dialog_snapshot
+        records: list[dict[str, Any]] = []
+        if self.dialogs is not None and self.account_id:
+            try:
+                records = await self.dialogs.list_for_account(self.account_id)
+            except Exception as exc:
+                logger.warning('Failed to load dialog snapshot: %s', exc)
+        self.dialog_snapshot = {int(record['entity_id']): record for record in records}
+        return self.dialog_snapshot
+
+    async def save_dialog_snapshot(self, changed: list[dict[str, Any]], removed: list[int]) -> None:
+        snapshot = await self.load_dialog_snapshot()
+        for record in changed:
+            snapshot[record['entity_id']] = record
+        for entity_id in removed:
+            snapshot.pop(entity_id, None)
+        if self.dialogs is None or not self.account_id:
+            return
+        try:
+            await self.dialogs.upsert_many(self.account_id, changed)
+            await self.dialogs.delete_many(self.account_id, removed)
+        except Exception as exc:
+            logger.warning('Failed to persist dialog snapshot: %s', exc)
+
+    async def forget_entity(self, entity_id: int) -> None:
+        self.peer_cache.remove(entity_id)
+        if self.entities is None or not self.account_id:
+            return
+        try:
+            await self.entities.delete(self.account_id, int(entity_id))
+        except Exception as exc:
+            logger.warning('Failed to drop cached entity %s: %s', entity_id, exc)
+
+
+class AccountPool:
+    def __init__(self, accounts: list[TelegramAccount]) -> None:
+        self.accounts = accounts
+        self.next_index = 0
+
+    def pick(self, key: int | None = None) -> TelegramAccount:
+        count = len(self.accounts)
+        if key is None:
+            start = self.next_index
+            self.next_index = (self.next_index + 1) % count
+        else:
+            start = int(key) % count
+        now = time.monotonic()
+        for offset in range(count):
+            account = self.accounts[(start + offset) % count]
+            if account.is_available(now):
+                return account
+        return min(self.accounts, key=lambda account: account.cooldown_until)
+
+    def has_spare(self, account: TelegramAccount) -> bool:
+        now = time.monotonic()
+        return any(other is not account and other.is_available(now) for other in self.accounts)
+
+    def pick_for_peer(self, entity_id: int) -> TelegramAccount:
+        now = time.monotonic()
+        for account in self.accounts:
+            if entity_id in account.peer_cache.records and account.is_available(now):
+                return account
+        return self.pick(entity_id)
+
+    async def acquire(self, key: int | None = None) -> TelegramAccount:
+        account = self.pick(key)
+        delay = account.cooldown_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return account
+
+
+DialogLoader = Callable[[TelegramAccount], Awaitable[dict[int, Any]]]
+
+
+class TelegramService:
+    def __init__(
+        self,
+        entities: EntitiesRepository | None = None,
+        dialogs: DialogsRepository | None = None,
+        accounts: list[TelegramAccount] | None = None,
+    ) -> None:
+        self.scheduler = RpcScheduler(
+            RPC_LIMITS,
+            default_limit=RPC_DEFAULT_LIMIT,
+            max_flood_wait=FLOOD_WAIT_LIMIT,
+            max_retries=RPC_MAX_RETRIES,
+            on_flood_wait=self.hand_off_flood_wait,
+        )
+        if accounts is None:
+            accounts = [
+                TelegramAccount(
+                    ScheduledTelegramClient(
+                        StringSession(session),
+                        TELEGRAM_API_ID,
+                        TELEGRAM_API_HASH,
+                        scheduler=self.scheduler,
+                    ),
+                    entities,
+                    dialogs,
+                )
+                for session in TELETHON_SESSIONS
+            ]
+        self.pool = AccountPool(accounts)
+        self.search_cache = TtlCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_SECONDS)
+        self.description_cache = TtlCache(
+            DESCRIPTION_CACHE_SIZE,
+            DESCRIPTION_CACHE_TTL_SECONDS,
+        )
+
+    @property
+    def accounts(self) -> list[TelegramAccount]:
+        return self.pool.accounts
+
+    def hand_off_flood_wait(self, account_key: int, seconds: int) -> bool:
+        for account in self.accounts:
+            if id(account.client) == account_key:
+                account.cool_down(seconds)
+                return self.pool.has_spare(account)
+        return False
+
+    async def start(self) -> None:
+        await asyncio.gather(*(account.start() for account in self.accounts))
+
+    async def close(self) -> None:
+        for account in self.accounts:
+            await account.close()
+
+    async def run_with_failover(
+        self,
+        operation: Callable[[TelegramAccount], Awaitable[T]],
+        key: int | None = None,
+    ) -> T:
+        attempts = 0
+        while True:
+            account = await self.pool.acquire(key)
+            try:
+                return await operation(account)
+            except FloodWaitError as exc:
+                account.cool_down(exc.seconds)
+                attempts += 1
+                if attempts >= len(self.accounts):
+                    raise
+
     async def resolve_channel(self, username: str) -> dict[str, Any] | None:
         await self.start()
-        try:
-            entity = await self.client.get_entity(username)
+
+        async def resolve(account: TelegramAccount) -> dict[str, Any] | None:
+            # Known channels are answered from the peer cache without an RPC; a
+            # stale cached peer is dropped and re-resolved when history paging hits it.
+            record = account.peer_cache.find_by_username(username)
+            if record is not None and record.get('title'):
+                return {'id': record['entity_id'], 'title': record['title'], 'username': record['username']}
+            entity = await account.client.get_entity(username)
             if entity is None:
                 return None
-
-            title = getattr(entity, 'title', None)
+            await account.remember_entities([entity])
             entity_username = getattr(entity, 'username', None) or username
-            entity_id = getattr(entity, 'id', None)
             return {
-                'id': entity_id,
-                'title': title or entity_username,
+                'id': getattr(entity, 'id', None),
+                'title': getattr(entity, 'title', None) or entity_username,
                 'username': entity_username,
             }
+
+        try:
+            with interactive_priority():
+                return await self.run_with_failover(resolve)
         except (RPCError, Exception) as exc:
             logger.warning('Telethon failed for %s: %s', username, exc)
             return None
 
     async def search_channels(self, query: str, limit: int = 10) -> list[dict[str, Any]]:
+        normalized = normalize_search_query(query)
+        cached = self.find_cached_search(normalized, limit)
+        if cached is not None:
+            return cached
         await self.start()
-        try:
-            result = await self.client(
+
+        async def search(account: TelegramAccount) -> tuple[list[Any], bool]:
+            result = await account.client(
                 functions.contacts.SearchRequest(
                     q=query,
                     limit=limit,
                 ),
             )
-            channels: list[dict[str, Any]] = []
-            for chat in result.chats:
-                if not isinstance(chat, types.Channel) or chat.megagroup:
-                    continue
-
-                description = None
-                try:
-                    full = await self.client(functions.channels.GetFullChannelRequest(chat))
-                    description = getattr(full.full_chat, 'about', None)
-                except (RPCError, Exception) as exc:
-                    logger.warning(
-                        'Telethon failed to fetch channel details for %s: %s',
-                        chat.id,
-                        exc,
-                    )
+            await account.remember_entities(list(result.chats))
+            chats = [
+                chat
+                for chat in result.chats
+                if isinstance(chat, types.Channel) and not chat.megagroup
+            ]
+            descriptions = await asyncio.gather(
+                *(self.fetch_channel_description(account, chat) for chat in chats),
+            )
+            channels = [
+                {
+                    'id': chat.id,
+                    'title': chat.title or chat.username or str(chat.id),
+                    'username': chat.username,
+                    'description': description,
+                }
+                for chat, description in zip(chats, descriptions)
+            ]
+            # Only the peers the server returned show whether it ran out of matches;
+            # result.chats also carries megagroups and chats referenced by them.
+            return channels, len(result.my_results) + len(result.results) < limit
 
-                channels.append(
-                    {
-                        'id': chat.id,
-                        'title': chat.title or chat.username or str(chat.id),
-                        'username': chat.username,
-                        'description': description,
-                    },
-                )
-            return channels
+        try:
+            with interactive_priority():
+                channels, complete = await self.run_with_failover(search)
         except (RPCError, Exception) as exc:
             logger.warning('Telethon channel search failed for %s: %s', query, exc)
             return []
+        self.search_cache.set(normalized, {'limit': limit, 'complete': complete, 'items': channels})
+        return [dict(channel) for channel in channels]
+
+    def find_cached_search(self, normalized: str, limit: int) -> list[dict[str, Any]] | None:
+        entry = self.search_cache.get(normalized)
+        if entry is not None and (entry['complete'] or entry['limit'] >= limit):
+            return [dict(channel) for channel in entry['items'][:limit]]
+        return None
+
+    async def fetch_channel_description(self, account: TelegramAccount, chat: types.Channel) -> str | None:
+        cached = self.description_cache.get(chat.id, NO_DESCRIPTION)
+        if cached is not NO_DESCRIPTION:
+            return cached
+        try:
+            full = await account.client(functions.channels.GetFullChannelRequest(chat))
+        except FloodWaitError as exc:
+            account.cool_down(exc.seconds)
+            return None
+        except (RPCError, Exception) as exc:
+            logger.warning(
+                'Telethon failed to fetch channel details for %s: %s',
+                chat.id,
+                exc,
+            )
+            return None
+        description = getattr(full.full_chat, 'about', None)
+        self.description_cache.set(chat.id, description)
+        return description
+
+    async def refresh_dialog_snapshot(
+        self,
+        account: TelegramAccount,
+        *,
+        full_rescan: bool = False,
+    ) -> dict[int, dict[str, Any]]:
+        await account.start()
+        async with account.dialog_lock:
+            snapshot = await account.load_dialog_snapshot()
+            seen: set[int] = set()
+            changed: list[dict[str, Any]] = []
+            entities: list[Any] = []
+            complete = False
+            try:
+                async for dialog in account.client.iter_dialogs():
+                    record = build_dialog_record(dialog)
+                    if record is None:
+                        continue
+                    previous = snapshot.get(record['entity_id'])
+                    # Dialogs come newest activity first, so the first unpinned dialog
+                    # whose top message is already known marks where nothing changed.
+                    if (
+                        not full_rescan
+                        and not dialog.pinned
+                        and previous is not None
+                        and previous['top_message_id'] == record['top_message_id']
+                    ):
+                        break
+                    seen.add(record['entity_id'])
+                    entities.append(dialog.entity)
+                    if previous != record:
+                        changed.append(record)
+                complete = True
+            except FloodWaitError as exc:
+                account.cool_down(exc.seconds)
+                logger.warning('Telethon dialog fetch hit a flood wait: %s', exc)
+            except (RPCError, Exception) as exc:
+                logger.warning('Telethon dialog fetch failed: %s', exc)
+            removed: list[int] = []
+            if full_rescan and complete:
+                removed = [entity_id for entity_id in snapshot if entity_id not in seen]
+            await account.save_dialog_snapshot(changed, removed)
+            await account.remember_entities(entities)
+            logger.info(
+                'Dialog snapshot of account %s: %s changed, %s removed, %s total',
+                account.account_id,
+                len(changed),
+                len(removed),
+                len(snapshot),
+            )
+            return snapshot
 
-    async def list_dialog_channels(self, limit: int | None = None) -> list[dict[str, Any]]:
+    async def list_dialog_channels(self, *, full_rescan: bool = False) -> list[dict[str, Any]]:
         await self.start()
         channels: dict[int, dict[str, Any]] = {}
-        try:
-            async for dialog in self.client.iter_dialogs(limit=limit):
-                entity = dialog.entity
-                if not isinstance(
-                    entity,
-                    (types.Channel, types.ChannelForbidden, types.Chat, types.ChatForbidden),
-                ):
+        for account in self.accounts:
+            snapshot = await self.refresh_dialog_snapshot(account, full_rescan=full_rescan)
+            for record in snapshot.values():
+                if record['kind'] not in ('channel', 'chat'):
                     continue
-                channel_id = getattr(entity, 'id', None)
-                if channel_id is None:
-                    continue
-                username = getattr(entity, 'username', None)
-                title = getattr(entity, 'title', None) or username or str(channel_id)
-                channels[int(channel_id)] = {
-                    'id': int(channel_id),
-                    'title': title,
+                channel_id = int(record['entity_id'])
+                username = record.get('username')
+                channels[channel_id] = {
+                    'id': channel_id,
+                    'title': record.get('title') or username or str(channel_id),
                     'username': username,
                 }
-        except (RPCError, Exception) as exc:
-            logger.warning('Telethon dialog fetch failed: %s', exc)
         return list(channels.values())
 
-    async def _load_dialog_entities(self) -> dict[int, Any]:
+    async def member_channel_ids(self) -> set[int]:
         await self.start()
-        entities: dict[int, Any] = {}
-        try:
-            async for dialog in self.client.iter_dialogs():
-                entity = dialog.entity
-                entity_id = getattr(entity, 'id', None)
-                if entity_id is None:
-                    continue
-                entities[int(entity_id)] = entity
-        except (RPCError, Exception) as exc:
-            logger.warning('Telethon dialog entity fetch failed: %s', exc)
-        return entities
+        member_ids: set[int] = set()
+        for account in self.accounts:
+            snapshot = await self.refresh_dialog_snapshot(account)
+            member_ids.update(entity_id for entity_id, record in snapshot.items() if record['kind'] == 'channel')
+        return member_ids
 
-    async def build_reply_data(
-        self,
-        message: types.Message,
-        reply_cache: dict[tuple[int, int], dict[str, Any]],
-        channel_id: int,
-    ) -> dict[str, Any] | None:
-        reply_id = message.reply_to_msg_id
-        if not reply_id:
-            return None
-        cache_key = (channel_id, reply_id)
-        cached = reply_cache.get(cache_key)
-        if cached:
-            return cached
-        reply_data: dict[str, Any] = {
-            'message_id': reply_id,
-            'user_id': None,
-            'text': '',
+    async def _load_dialog_entities(self, account: TelegramAccount) -> dict[int, Any]:
+        snapshot = await self.refresh_dialog_snapshot(account)
+        return {
+            entity_id: build_input_peer(record)
+            for entity_id, record in snapshot.items()
+            if record['kind'] == 'chat' or record.get('access_hash') is not None
         }
-        try:
-            reply_message = await message.get_reply_message()
-        except (RPCError, Exception) as exc:
-            logger.warning('Telethon failed to fetch reply %s: %s', reply_id, exc)
-            reply_message = None
-        if reply_message:
-            reply_data = {
-                'message_id': reply_message.id,
-                'user_id': reply_message.sender_id,
-                'text': reply_message.message or '',
-            }
-        reply_cache[cache_key] = reply_data
-        return reply_data
 
-    def build_forwarded_data(self, message: types.Message) -> dict[str, Any] | None:
+    async def build_reply_map(
+        self,
+        account: TelegramAccount,
+        entity: Any,
+        reply_ids: set[int],
+        known_messages: dict[int, tuple[int | None, str]],
+    ) -> dict[int, ReplyRecord]:
+        replies: dict[int, ReplyRecord] = {}
+        missing: list[int] = []
+        for reply_id in sorted(reply_ids):
+            known = known_messages.get(reply_id)
+            if known is None:
+                missing.append(reply_id)
+                continue
+            replies[reply_id] = ReplyRecord(reply_id, known[0], known[1])
+        for batch in chunked(missing, REPLY_BATCH_SIZE):
+            fetched: list[Any] = []
+            while True:
+                try:
+                    fetched = await account.client.get_messages(entity, ids=batch)
+                    break
+                except FloodWaitError as exc:
+                    logger.warning('Telethon flood wait %ss while fetching replies', exc.seconds)
+                    account.cool_down(exc.seconds)
+                    await asyncio.sleep(exc.seconds)
+                except (RPCError, Exception) as exc:
+                    logger.warning('Telethon failed to fetch %s replies: %s', len(batch), exc)
+                    break
+            fetched_by_id = {message.id: message for message in fetched or [] if message}
+            for reply_id in batch:
+                reply_message = fetched_by_id.get(reply_id)
+                replies[reply_id] = ReplyRecord(
+                    reply_id,
+                    reply_message.sender_id if reply_message else None,
+                    (reply_message.message or '') if reply_message else '',
+                )
+        return replies
+
+    def build_forwarded_data(self, message: types.Message) -> ForwardRecord | None:
         if not message.fwd_from:
             return None
         fwd = message.fwd_from
@@ -220,198 +712,541 @@ class TelegramService:
             if isinstance(fwd.from_id, types.PeerChannel):
                 from_channel_id = peer_id
         from_name = fwd.from_name or fwd.post_author
-        return {
-            'from_user_id': from_user_id,
-            'from_channel_id': from_channel_id,
-            'from_name': from_name,
-            'from_message_id': fwd.channel_post,
-        }
+        return ForwardRecord(from_user_id, from_channel_id, from_name, fwd.channel_post)
 
-    async def fetch_channel_messages(
+    def build_message_record(
         self,
-        channels: list[dict[str, Any]],
+        channel_id: int,
+        message: types.Message,
         *,
-        start_date: datetime,
-        end_date: datetime,
-        max_messages: int | None = None,
-        include_replies: bool = True,
         include_forwarded: bool = True,
-    ) -> list[dict[str, Any]]:
-        await self.start()
-        reply_cache: dict[tuple[int, int], dict[str, Any]] | None = (
-            {} if include_replies else None
+    ) -> MessageRecord:
+        return MessageRecord(
+            channel_id,
+            message.id,
+            message.sender_id,
+            normalize_message_date(message.date),
+            message.message or '',
+            forwarded=self.build_forwarded_data(message) if include_forwarded else None,
         )
-        collected: list[dict[str, Any]] = []
-        dialog_entities: dict[int, Any] | None = None
-        for channel in channels:
-            channel_id_value = channel.get('id')
-            if channel_id_value is None:
-                continue
-            channel_id = int(channel_id_value)
-            username = channel.get('username')
-            entity = None
-            resolve_error: Exception | None = None
-            if username:
-                try:
-                    entity = await self.client.get_entity(username)
-                except (RPCError, Exception) as exc:
-                    resolve_error = exc
-            if entity is None:
-                try:
-                    entity = await self.client.get_entity(channel_id)
-                except (RPCError, Exception) as exc:
-                    resolve_error = exc
-            if entity is None:
-                if dialog_entities is None:
-                    dialog_entities = await self._load_dialog_entities()
-                entity = dialog_entities.get(channel_id) if dialog_entities else None
-            if entity is None:
-                logger.warning(
-                    'Telethon failed to resolve channel %s: %s',
-                    channel_id,
-                    resolve_error,
-                )
-                continue
-            channel_messages: list[dict[str, Any]] = []
+
+    async def resolve_channel_entity(
+        self,
+        account: TelegramAccount,
+        channel_id: int,
+        username: str | None,
+        load_dialog_entities: DialogLoader,
+    ) -> tuple[Any, bool]:
+        cached = account.peer_cache.get(channel_id)
+        if cached is not None:
+            return cached, True
+        entity = None
+        resolve_error: Exception | None = None
+        if username:
+            try:
+                entity = await account.client.get_entity(username)
+            except FloodWaitError:
+                raise
+            except (RPCError, Exception) as exc:
+                resolve_error = exc
+        if entity is None:
+            try:
+                entity = await account.client.get_entity(channel_id)
+            except FloodWaitError:
+                raise
+            except (RPCError, Exception) as exc:
+                resolve_error = exc
+        if entity is None:
+            dialog_entities = await load_dialog_entities(account)
+            entity = dialog_entities.get(channel_id)
+        if entity is None:
+            raise LookupError(f'Unable to resolve channel {channel_id}: {resolve_error}')
+        await account.remember_entities([entity])
+        return entity, False
+
+    async def attach_replies(
+        self,
+        account: TelegramAccount,
+        entity: Any,
+        pending_replies: list[tuple[MessageRecord, int]],
+        known_messages: dict[int, tuple[int | None, str]],
+    ) -> None:
+        if not pending_replies or entity is None:
+            return
+        replies = await self.build_reply_map(
+            account,
+            entity,
+            {reply_id for _, reply_id in pending_replies},
+            known_messages,
+        )
+        for record, reply_id in pending_replies:
+            record.reply_to = replies[reply_id]
+
+    async def iter_channel_pages(
+        self,
+        channel_id: int,
+        username: str | None,
+        *,
+        start_date: datetime | None,
+        end_date: datetime | None,
+        min_id: int,
+        include_replies: bool,
+        include_forwarded: bool,
+        load_dialog_entities: DialogLoader,
+        report: dict[str, Any],
+        max_id: int = 0,
+        account_key: int | None = None,
+    ) -> AsyncIterator[list[MessageRecord]]:
+        started = time.monotonic()
+        account_key = channel_id if account_key is None else account_key
+        report.update(
+            {
+                'channel_id': channel_id,
+                'messages': 0,
+                'duration_seconds': 0.0,
+                'flood_wait_seconds': 0,
+                'error': None,
+                'last_message_id': None,
+                'last_message_date': None,
+            },
+        )
+        page: list[MessageRecord] = []
+        pending_replies: list[tuple[MessageRecord, int]] = []
+        known_messages: dict[int, tuple[int | None, str]] = {}
+        held_page: list[MessageRecord] = []
+        held_replies: list[tuple[MessageRecord, int]] = []
+        held_known: dict[int, tuple[int | None, str]] = {}
+        senders: dict[int, Any] = {}
+        account = await self.pool.acquire(account_key)
+        entity = None
+        from_cache = False
+        offset_id = max_id
+        done = False
+        while not done:
             try:
-                async for message in self.client.iter_messages(entity, offset_date=end_date):
+                if entity is None:
+                    entity, from_cache = await self.resolve_channel_entity(
+                        account,
+                        channel_id,
+                        username,
+                        load_dialog_entities,
+                    )
+                async for message in account.client.iter_messages(
+                    entity,
+                    offset_date=None if offset_id else end_date,
+                    offset_id=offset_id,
+                    min_id=min_id,
+                ):
+                    offset_id = message.id
+                    if include_replies:
+                        known_messages[message.id] = (message.sender_id, message.message or '')
                     message_date = normalize_message_date(message.date)
-                    if message_date < start_date:
-                        break
-                    if message_date > end_date:
+                    if end_date is not None and message_date > end_date:
                         continue
-                    text = message.message or ''
-                    if not text:
-                        continue
-                    reply_data = None
-                    if include_replies and reply_cache is not None:
-                        reply_data = await self.build_reply_data(message, reply_cache, channel_id)
-                    forwarded = self.build_forwarded_data(message) if include_forwarded else None
-                    payload = {
-                        'channel_id': channel_id,
-                        'message_id': message.id,
-                        'user_id': message.sender_id,
-                        'date': message_date,
-                        'text': text,
-                    }
-                    if reply_data:
-                        payload['reply_to'] = reply_data
-                    if forwarded:
-                        payload['forwarded'] = forwarded
-                    channel_messages.append(payload)
-                    if max_messages and len(channel_messages) >= max_messages:
+                    if report['last_message_id'] is None:
+                        report['last_message_id'] = message.id
+                        report['last_message_date'] = message_date
+                    if start_date is not None and message_date < start_date:
                         break
+                    if not message.message:
+                        continue
+                    sender = getattr(message, 'sender', None)
+                    if isinstance(sender, types.User):
+                        senders[sender.id] = sender
+                    record = self.build_message_record(
+                        channel_id,
+                        message,
+                        include_forwarded=include_forwarded,
+                    )
+                    if include_replies and message.reply_to_msg_id:
+                        pending_replies.append((record, message.reply_to_msg_id))
+                    page.append(record)
+                    report['messages'] += 1
+                    if len(page) >= MESSAGE_PAGE_SIZE:
+                        # Replies usually point to older messages, so a page is held back
+                        # until the next one is read and can serve its reply targets.
+                        if held_page:
+                            await self.attach_replies(
+                                account,
+                                entity,
+                                held_replies,
+                                {**held_known, **known_messages},
+                            )
+                            yield held_page
+                        held_page, held_replies, held_known = page, pending_replies, known_messages
+                        page, pending_replies, known_messages = [], [], {}
+                done = True
+            except FloodWaitError as exc:
+                logger.warning('Telethon flood wait %ss for channel %s', exc.seconds, channel_id)
+                report['flood_wait_seconds'] += exc.seconds
+                account.cool_down(exc.seconds)
+                next_account = await self.pool.acquire(account_key)
+                if next_account is not account:
+                    await self.attach_replies(account, entity, held_replies, {**held_known, **known_messages})
+                    held_replies, held_known = [], {}
+                    await self.attach_replies(account, entity, pending_replies, known_messages)
+                    pending_replies, known_messages = [], {}
+                    account = next_account
+                    entity = None
+            except STALE_PEER_ERRORS as exc:
+                if not from_cache:
+                    logger.warning('Telethon failed to fetch channel %s: %s', channel_id, exc)
+                    report['error'] = str(exc)
+                    done = True
+                    continue
+                logger.info('Cached peer for channel %s is stale: %s', channel_id, exc)
+                await account.forget_entity(channel_id)
+                entity = None
+                from_cache = False
             except (RPCError, Exception) as exc:
                 logger.warning('Telethon failed to fetch channel %s: %s', channel_id, exc)
-                continue
-            collected.extend(channel_messages)
-        return collected
+                report['error'] = str(exc)
+                done = True
+        if held_page:
+            await self.attach_replies(account, entity, held_replies, {**held_known, **known_messages})
+            yield held_page
+        if page:
+            await self.attach_replies(account, entity, pending_replies, known_messages)
+            yield page
+        await account.remember_entities(list(senders.values()))
+        report['duration_seconds'] = round(time.monotonic() - started, 3)
+        logger.info(
+            'Fetched %s messages from channel %s in %.3fs',
+            report['messages'],
+            channel_id,
+            report['duration_seconds'],
+        )
+
+    async def probe_message_id(self, account: TelegramAccount, entity: Any, before: datetime | None) -> int:
+        messages = await account.client.get_messages(entity, limit=1, offset_date=before)
+        return messages[0].id if messages else 0
+
+    async def plan_message_ranges(
+        self,
+        channel_id: int,
+        username: str | None,
+        *,
+        start_date: datetime | None,
+        end_date: datetime | None,
+        min_id: int,
+        load_dialog_entities: DialogLoader,
+    ) -> list[tuple[int, int]]:
+        account = await self.pool.acquire(channel_id)
+        try:
+            entity, _ = await self.resolve_channel_entity(account, channel_id, username, load_dialog_entities)
+            # Dates only grow with ids inside a channel, so two offset_date probes turn
+            # the window into an id range. offset_date is exclusive, hence the second.
+            upper = await self.probe_message_id(
+                account,
+                entity,
+                end_date + timedelta(seconds=1) if end_date is not None else None,
+            )
+            lower = min_id
+            if start_date is not None and not min_id:
+                lower = await self.probe_message_id(account, entity, start_date)
+        except FloodWaitError as exc:
+            account.cool_down(exc.seconds)
+            return [(min_id, 0)]
+        except (RPCError, Exception) as exc:
+            logger.info('Message id probe failed for channel %s: %s', channel_id, exc)
+            return [(min_id, 0)]
+        if upper <= lower:
+            return [(lower, lower + 1)]
+        parts = min(RANGE_SPLIT_PARTS, max(1, (upper - lower) // RANGE_SPLIT_MIN_IDS))
+        step = -(-(upper - lower) // parts)
+        return [(low, min(low + step, upper) + 1) for low in range(lower, upper, step)]
+
+    async def iter_channel_history(
+        self,
+        channel_id: int,
+        username: str | None,
+        *,
+        report: dict[str, Any],
+        **options: Any,
+    ) -> AsyncIterator[list[MessageRecord]]:
+        ranges = await self.plan_message_ranges(
+            channel_id,
+            username,
+            start_date=options['start_date'],
+            end_date=options['end_date'],
+            min_id=options['min_id'],
+            load_dialog_entities=options['load_dialog_entities'],
+        )
+        if len(ranges) == 1:
+            min_id, max_id = ranges[0]
+            async for page in self.iter_channel_pages(
+                channel_id,
+                username,
+                report=report,
+                **{**options, 'min_id': min_id},
+                max_id=max_id,
+            ):
+                yield page
+            return
+
+        started = time.monotonic()
+        reports: list[dict[str, Any]] = [{} for _ in ranges]
+        queue: asyncio.Queue[list[MessageRecord] | None] = asyncio.Queue(maxsize=len(ranges))
+
+        async def produce(index: int, min_id: int, max_id: int) -> None:
+            async for page in self.iter_channel_pages(
+                channel_id,
+                username,
+                report=reports[index],
+                **{**options, 'min_id': min_id},
+                max_id=max_id,
+                account_key=channel_id + index,
+            ):
+                await queue.put(page)
+
+        async def run_producers() -> None:
+            try:
+                async with asyncio.TaskGroup() as group:
+                    for index, (min_id, max_id) in enumerate(ranges):
+                        group.create_task(produce(index, min_id, max_id))
+            except Exception:
+                await queue.put(None)
+                raise
+            await queue.put(None)
+
+        producer = asyncio.create_task(run_producers())
+        try:
+            while True:
+                page = await queue.get()
+                if page is None:
+                    break
+                yield page
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+                with suppress(asyncio.CancelledError):
+                    await producer
+        report.update(merge_range_reports(channel_id, reports))
+        report['duration_seconds'] = round(time.monotonic() - started, 3)
+
+    def make_dialog_loader(self) -> DialogLoader:
+        dialog_lock = asyncio.Lock()
+        dialog_entities: dict[int, dict[int, Any]] = {}
+
+        async def load_dialog_entities(account: TelegramAccount) -> dict[int, Any]:
+            async with dialog_lock:
+                if id(account) not in dialog_entities:
+                    dialog_entities[id(account)] = await self._load_dialog_entities(account)
+            return dialog_entities[id(account)]
+
+        return load_dialog_entities
 
     async def _resolve_user_entities(
         self,
+        account: TelegramAccount,
         user_ids: list[int],
-    ) -> list[types.User | types.UserEmpty]:
-        await self.start()
+    ) -> tuple[list[types.User | types.UserEmpty], list[int]]:
+        # Returns the resolved users and the ids left unresolved by a flood wait
+        # longer than the scheduler sleeps through.
+        await account.start()
         resolved: list[types.User | types.UserEmpty] = []
         if not user_ids:
-            return resolved
+            return resolved, []
         unique_ids = list({int(user_id) for user_id in user_ids if user_id})
-        get_entities = getattr(self.client, 'get_entities', None)
-        if callable(get_entities):
-            for batch in chunked(unique_ids, 100):
-                try:
-                    entities = await get_entities(batch)
-                except (RPCError, Exception) as exc:
-                    logger.warning('Telethon failed to resolve user batch: %s', exc)
-                    entities = None
-                if entities is None:
-                    for user_id in batch:
-                        try:
-                            entity = await self.client.get_entity(user_id)
-                        except (RPCError, Exception) as inner_exc:
-                            logger.warning(
-                                'Telethon failed to resolve user %s: %s',
-                                user_id,
-                                inner_exc,
-                            )
-                            continue
-                        if isinstance(entity, (types.User, types.UserEmpty)):
-                            resolved.append(entity)
-                    continue
-                if not isinstance(entities, list):
-                    entities = [entities]
-                for entity in entities:
-                    if isinstance(entity, (types.User, types.UserEmpty)):
-                        resolved.append(entity)
-            return resolved
-        for user_id in unique_ids:
+        batches = chunked(unique_ids, 100)
+        unresolved: list[int] = []
+        for position, batch in enumerate(batches):
+            targets = [account.peer_cache.get(user_id) or user_id for user_id in batch]
             try:
-                entity = await self.client.get_entity(user_id)
+                entities = await account.client.get_entity(targets)
+            except FloodWaitError as exc:
+                account.cool_down(exc.seconds)
+                logger.warning('Telethon flood wait %ss while resolving users', exc.seconds)
+                unresolved = [user_id for rest in batches[position:] for user_id in rest]
+                break
             except (RPCError, Exception) as exc:
+                logger.warning('Telethon failed to resolve user batch: %s', exc)
+                entities = None
+            if entities is None:
+                entities = []
+                for user_id, target in zip(batch, targets):
+                    entity = await self.resolve_user_entity(account, user_id, target)
+                    if entity is not None:
+                        entities.append(entity)
+            if not isinstance(entities, list):
+                entities = [entities]
+            for entity in entities:
+                if isinstance(entity, (types.User, types.UserEmpty)):
+                    resolved.append(entity)
+        await account.remember_entities(resolved)
+        return resolved, unresolved
+
+    async def resolve_user_entity(self, account: TelegramAccount, user_id: int, target: Any) -> Any:
+        try:
+            return await account.client.get_entity(target)
+        except STALE_PEER_ERRORS as exc:
+            if target == user_id:
                 logger.warning('Telethon failed to resolve user %s: %s', user_id, exc)
-                continue
-            if isinstance(entity, (types.User, types.UserEmpty)):
-                resolved.append(entity)
-        return resolved
+                return None
+            logger.info('Cached peer for user %s is stale: %s', user_id, exc)
+            await account.forget_entity(user_id)
+        except (RPCError, Exception) as exc:
+            logger.warning('Telethon failed to resolve user %s: %s', user_id, exc)
+            return None
+        try:
+            return await account.client.get_entity(user_id)
+        except (RPCError, Exception) as exc:
+            logger.warning('Telethon failed to resolve user %s: %s', user_id, exc)
+            return None
 
     async def fetch_user_profiles(
         self,
         user_ids: list[int],
+        *,
+        interactive: bool = False,
+        known_photo_ids: dict[int, int] | None = None,
     ) -> list[dict[str, Any]]:
-        await self.start()
-        entities = await self._resolve_user_entities(user_ids)
         profiles: list[dict[str, Any]] = []
-        for entity in entities:
-            user_id = getattr(entity, 'id', None)
-            if user_id is None:
-                continue
+        async for batch in self.iter_user_profiles(
+            user_ids,
+            interactive=interactive,
+            known_photo_ids=known_photo_ids,
+        ):
+            profiles.extend(batch)
+        return profiles
 
-            username = getattr(entity, 'username', None)
-            first_name = getattr(entity, 'first_name', None)
-            last_name = getattr(entity, 'last_name', None)
-            display_name = build_display_name(
-                first_name=first_name,
-                last_name=last_name,
-                username=username,
-                user_id=int(user_id),
-            )
+    async def iter_user_profiles(
+        self,
+        user_ids: list[int],
+        *,
+        interactive: bool = False,
+        known_photo_ids: dict[int, int] | None = None,
+        concurrency: int = PROFILE_CONCURRENCY,
+        batch_size: int = PROFILE_BATCH_SIZE,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        await self.start()
+        groups: dict[int, tuple[TelegramAccount, list[int]]] = {}
+        for user_id in {int(user_id) for user_id in user_ids if user_id}:
+            account = self.pool.pick_for_peer(user_id)
+            groups.setdefault(id(account), (account, []))[1].append(user_id)
+        known_photo_ids = known_photo_ids or {}
+        semaphore = asyncio.Semaphore(max(1, concurrency))
 
-            about = None
-            try:
-                full = await self.client(functions.users.GetFullUserRequest(entity))
-                full_user = getattr(full, 'full_user', None)
-                if full_user is not None:
-                    about = getattr(full_user, 'about', None)
-                if about is None:
-                    about = getattr(full, 'about', None)
-            except (RPCError, Exception) as exc:
-                logger.warning('Telethon failed to fetch user details for %s: %s', user_id, exc)
+        async def resolve(account: TelegramAccount, account_user_ids: list[int]):
+            resolved: list[tuple[TelegramAccount, Any]] = []
+            pending = account_user_ids
+            for _ in self.accounts:
+                with interactive_priority(interactive):
+                    entities, pending = await self._resolve_user_entities(account, pending)
+                resolved.extend((account, entity) for entity in entities)
+                if not pending:
+                    break
+                # The flooded account is cooling down, so the pool hands out another one.
+                account = self.pool.pick()
+                if not account.is_available():
+                    break
+            if pending:
+                logger.warning('%s users were left unresolved by flood waits', len(pending))
+            return resolved
 
-            photo_bytes = None
-            photo_mime = None
-            photo = getattr(entity, 'photo', None)
-            if photo is not None:
-                try:
-                    photo_bytes = await self.client.download_profile_photo(
+        async def fetch(account: TelegramAccount, entity: Any) -> dict[str, Any] | None:
+            async with semaphore:
+                with interactive_priority(interactive):
+                    return await self.fetch_profile(
+                        account,
+                        entity,
+                        known_photo_ids.get(getattr(entity, 'id', None)),
+                    )
+
+        resolved = await asyncio.gather(
+            *(resolve(account, account_user_ids) for account, account_user_ids in groups.values()),
+        )
+        tasks = [
+            asyncio.create_task(fetch(account, entity))
+            for account_entities in resolved
+            for account, entity in account_entities
+        ]
+        try:
+            batch: list[dict[str, Any]] = []
+            for completed in asyncio.as_completed(tasks):
+                profile = await completed
+                if profile is None:
+                    continue
+                batch.append(profile)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def fetch_profile(
+        self,
+        account: TelegramAccount,
+        entity: Any,
+        known_photo_id: int | None = None,
+    ) -> dict[str, Any] | None:
+        user_id = getattr(entity, 'id', None)
+        if user_id is None:
+            return None
+
+        username = getattr(entity, 'username', None)
+        first_name = getattr(entity, 'first_name', None)
+        last_name = getattr(entity, 'last_name', None)
+        display_name = build_display_name(
+            first_name=first_name,
+            last_name=last_name,
+            username=username,
+            user_id=int(user_id),
+        )
+
+        about = None
+        try:
+            full = await account.client(functions.users.GetFullUserRequest(entity))
+            full_user = getattr(full, 'full_user', None)
+            if full_user is not None:
+                about = getattr(full_user, 'about', None)
+            if about is None:
+                about = getattr(full, 'about', None)
+        except FloodWaitError as exc:
+            account.cool_down(exc.seconds)
+            logger.warning('Telethon flood wait %ss for user details of %s', exc.seconds, user_id)
+        except (RPCError, Exception) as exc:
+            logger.warning('Telethon failed to fetch user details for %s: %s', user_id, exc)
+
+        photo_bytes = None
+        photo_mime = None
+        photo_id = getattr(getattr(entity, 'photo', None), 'photo_id', None)
+        keep_photo = photo_id is not None and photo_id == known_photo_id
+        if photo_id is not None and not keep_photo:
+            try:
+                photo_bytes = await asyncio.wait_for(
+                    account.client.download_profile_photo(
                         entity,
                         file=bytes,
                         download_big=False,
-                    )
-                except (RPCError, Exception) as exc:
-                    logger.warning('Telethon failed to download photo for %s: %s', user_id, exc)
-                if photo_bytes:
-                    photo_mime = guess_photo_mime(photo_bytes)
+                    ),
+                    PHOTO_TIMEOUT_SECONDS,
+                )
+            except FloodWaitError as exc:
+                account.cool_down(exc.seconds)
+                logger.warning('Telethon flood wait %ss for photo of %s', exc.seconds, user_id)
+            except TimeoutError:
+                logger.warning('Telethon photo download timed out for %s', user_id)
+            except (RPCError, Exception) as exc:
+                logger.warning('Telethon failed to download photo for %s: %s', user_id, exc)
+            if photo_bytes:
+                photo_mime = guess_photo_mime(photo_bytes)
+            else:
+                keep_photo = True
 
-            profiles.append(
-                {
-                    'user_id': int(user_id),
-                    'username': username,
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'display_name': display_name,
-                    'about': about,
-                    'photo_bytes': photo_bytes,
-                    'photo_mime': photo_mime,
-                },
-            )
-        return profiles
+        return {
+            'user_id': int(user_id),
+            'username': username,
+            'first_name': first_name,
+            'last_name': last_name,
+            'display_name': display_name,
+            'about': about,
+            'photo_id': photo_id,
+            'photo_bytes': photo_bytes,
+            'photo_mime': photo_mime,
+            'keep_photo': keep_photo,
+        }
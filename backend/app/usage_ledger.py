@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextlib import suppress
+from contextvars import ContextVar
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Iterator
+import asyncio
+import logging
+import uuid
+
+from app.exceptions import BudgetExceededError
+from app.storage.repositories.usage_ledger import UsageLedgerRepository
+
+
+logger = logging.getLogger(__name__)
+
+LEDGER_BATCH_SIZE = 200
+LEDGER_FLUSH_SECONDS = 5
+
+
+@dataclass(slots=True)
+class UsageScope:
+    prompt_id: int | None = None
+    channel_ids: list[int] = field(default_factory=list)
+    token_budget: int | None = None
+    analysis_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    tokens_used: int = 0
+    tokens_reserved: int = 0
+
+    def check(self, tokens: int) -> None:
+        if self.token_budget is not None and self.tokens_used + self.tokens_reserved + tokens > self.token_budget:
+            raise BudgetExceededError(
+                f'Analysis would exceed its token budget of {self.token_budget} '
+                f'({self.tokens_used} used, {self.tokens_reserved + tokens} more requested)',
+            )
+
+    def reserve(self, tokens: int) -> None:
+        self.check(tokens)
+        self.tokens_reserved += tokens
+
+    def settle(self, reserved: int, used: int) -> None:
+        self.tokens_reserved -= reserved
+        self.tokens_used += used
+
+
+usage_scope: ContextVar[UsageScope | None] = ContextVar('usage_scope', default=None)
+chunk_index: ContextVar[int | None] = ContextVar('chunk_index', default=None)
+
+
+@contextmanager
+def track_usage(scope: UsageScope) -> Iterator[UsageScope]:
+    token = usage_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        usage_scope.reset(token)
+
+
+class UsageLedger:
+    def __init__(
+        self,
+        repository: UsageLedgerRepository,
+        *,
+        batch_size: int = LEDGER_BATCH_SIZE,
+        flush_seconds: float = LEDGER_FLUSH_SECONDS,
+    ) -> None:
+        self.repository = repository
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.entries: list[dict[str, Any]] = []
+        self.wake = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.stats = {'recorded': 0, 'written': 0, 'dropped': 0}
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.task
+        await self.flush()
+
+    def record(self, entry: dict[str, Any]) -> None:
+        scope = usage_scope.get()
+        if scope is not None:
+            entry.setdefault('analysis_id', scope.analysis_id)
+            entry.setdefault('prompt_id', scope.prompt_id)
+            entry.setdefault('channel_ids', scope.channel_ids)
+        entry.setdefault('chunk_index', chunk_index.get())
+        self.entries.append(entry)
+        self.stats['recorded'] += 1
+        if len(self.entries) >= self.batch_size:
+            self.wake.set()
+
+    async def flush(self) -> None:
+        batch, self.entries = self.entries, []
+        if not batch:
+            return
+        try:
+            await self.repository.insert_many(batch)
+        except Exception as exc:
+            logger.warning('Failed to write %s usage ledger entries: %s', len(batch), exc)
+            self.stats['dropped'] += len(batch)
+            return
+        self.stats['written'] += len(batch)
+
+    async def run(self) -> None:
+        while True:
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self.wake.wait(), self.flush_seconds)
+            self.wake.clear()
+            await self.flush()
@@ -15,12 +15,19 @@ os.environ.setdefault('MONGO_DB', 'test')
 os.environ.setdefault('TELEGRAM_API_ID', '12345')
 os.environ.setdefault('TELEGRAM_API_HASH', 'hash')
 os.environ.setdefault('TELETHON_SESSION', 'session')
+os.environ.setdefault('TELEGRAM_LIVE_INGEST', 'false')
 os.environ.setdefault('DEEPSEEK_API_KEY', 'test')
 
+from app.analysis_utils import JsonItemStream
+from app.analysis_utils import count_message_tags
 from app.analysis_utils import ensure_aware
 from app.analysis_utils import extract_json_payload
+from app.analysis_utils import extract_message_tags
 from app.analysis_utils import format_message_block
 from app.analysis_utils import normalize_tag
+from app.analysis_utils import vocabulary_version
+from app.message_records import MessageRecord
+from app.message_records import ReplyRecord
 
 
 class AnalysisUtilsTests(unittest.TestCase):
@@ -38,20 +45,42 @@ class AnalysisUtilsTests(unittest.TestCase):
         payload = extract_json_payload('```json\n{"hashtags": []}\n```')
         self.assertEqual(payload, {'hashtags': []})
 
-    def test_format_message_block_includes_reply(self) -> None:
-        message = {
-            'channel_id': 1,
-            'message_id': 2,
-            'user_id': 3,
-            'date': datetime(2026, 1, 1, tzinfo=timezone.utc),
-            'text': 'hello',
-            'reply_to': {
-                'message_id': 1,
-                'user_id': 2,
-                'text': 'reply text',
-            },
-            'forwarded': None,
+    def test_json_item_stream_emits_items_as_they_complete(self) -> None:
+        content = '```json\n{"hashtags": [{"tag": "#a}{\\"", "count": 2}, {"tag": "#b", "count": 1}], "total": [1]}\n```'
+        stream = JsonItemStream()
+        emitted = []
+        for index in range(0, len(content), 5):
+            emitted.append(stream.feed(content[index : index + 5]))
+        items = [item for batch in emitted for item in batch]
+        self.assertEqual(items, [('hashtags', {'tag': '#a}{"', 'count': 2}), ('hashtags', {'tag': '#b', 'count': 1})])
+        self.assertTrue(emitted.index([items[0]]) < len(emitted) - 1)
+        self.assertEqual(extract_json_payload(stream.text)['total'], [1])
+
+    def test_extract_message_tags(self) -> None:
+        payload = {
+            'messages': [
+                {'channel_id': 1, 'message_id': 2, 'hashtags': ['News', '#news', 'bad tag']},
+                {'channel_id': '1', 'message_id': 3, 'hashtags': []},
+                {'channel_id': 1, 'hashtags': ['#lost']},
+            ],
         }
+        tags = extract_message_tags(payload)
+        self.assertEqual(tags, {(1, 2): ['#news'], (1, 3): []})
+        self.assertEqual(count_message_tags(tags.values()), [{'tag': '#news', 'count': 1}])
+
+    def test_vocabulary_version_ignores_order(self) -> None:
+        self.assertEqual(vocabulary_version(['#b', '#a']), vocabulary_version(['#a', '#b', '#a']))
+        self.assertNotEqual(vocabulary_version(['#a']), vocabulary_version(['#a', '#b']))
+
+    def test_format_message_block_includes_reply(self) -> None:
+        message = MessageRecord(
+            channel_id=1,
+            message_id=2,
+            user_id=3,
+            date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+            text='hello',
+            reply_to=ReplyRecord(message_id=1, user_id=2, text='reply text'),
+        )
         block = format_message_block(message)
         self.assertIn('reply:', block)
         self.assertIn('text:', block)